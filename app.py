@@ -8,109 +8,95 @@ app = marimo.App(width="medium", layout_file="layouts/app.grid.json")
 def __():
     ### Import what's needed
 
-    import altair as alt
+    # Only what the freshness check needs, heavier libraries come with their stages
     import os
-    import pandas as pd
     import marimo as mo
 
     from datetime import datetime, timedelta
     from dotenv import load_dotenv
+    from habits.profiling import profile_dir_for, profile_scope, start_profiling, write_profiles
 
     load_dotenv()
     HABITS_PATH = os.getenv("HABITS_PATH")
     START_TS = datetime.now()
+    start_profiling()
     return (
         HABITS_PATH,
         START_TS,
-        alt,
         datetime,
         load_dotenv,
         mo,
         os,
-        pd,
+        profile_dir_for,
+        profile_scope,
+        start_profiling,
         timedelta,
+        write_profiles,
     )
 
 
 @app.cell
-def __(HABITS_PATH, START_TS, datetime, os, pd, timedelta):
+def __(HABITS_PATH, START_TS, mo, profile_dir_for, profile_scope, write_profiles):
     ### Load data
 
-    # Get the file modification time
-    file_mod_time = datetime.fromtimestamp(os.path.getmtime(HABITS_PATH))
-
-    # Calculate the start of the current week (Monday at midnight)
-    start_of_week = START_TS - timedelta(days=START_TS.weekday())  # Get Monday
-    start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)  # Set to midnight
-
-    # Check if the file has been modified this week
-    if file_mod_time < start_of_week:
-        raise RuntimeError("The file has not been updated this week. Update the file and try again.")
-
-    # Load data
-    df = pd.read_csv(HABITS_PATH)
-    df
-    return df, file_mod_time, start_of_week
+    from habits.shared import dashboard_data
+
+    # Load, refresh the daily table and calc moving avgs once per export for all viewers,
+    # after which they're refreshed in the background whenever the export changes
+    with profile_scope() as load_profiles:
+        dashboard = dashboard_data(HABITS_PATH)
+    print(f"Loaded {len(dashboard.habits)} habits, data as of {dashboard.modified}")
+    # Save this session's profiles of loading if HABITS_PROFILE asked for them
+    if load_profiles:
+        print(write_profiles(load_profiles, profile_dir_for(HABITS_PATH), START_TS.timestamp()))
+
+    # The data this session shows, the habit picked and how often to look for newer data
+    get_snapshot, set_snapshot = mo.state(dashboard)
+    get_habit, set_habit = mo.state(dashboard.habits[0])
+    refresh = mo.ui.refresh(options=["1m", "5m", "10m"], default_interval="1m")
+    return (
+        dashboard,
+        dashboard_data,
+        get_habit,
+        get_snapshot,
+        load_profiles,
+        refresh,
+        set_habit,
+        set_snapshot,
+    )
 
 
 @app.cell
-def __(df, pd):
-    ### Fix some columns
-
-    # Map mood from Apple Health
-    mood_map = {
-        "Very pleasant": "3",
-        "Pleasant": "2",
-        "Slightly pleasant": "1",
-        "Neutral": "0",
-        "Slightly unpleasant": "-1",
-        "Unpleasant": "-2",
-        "Very unpleasant": "-3",
-    }
-
-    # Rewrite some columns
-    df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d").dt.date
-    df["Quantity"] = df["Quantity"].map(mood_map).combine_first(df["Quantity"])
-    df_clean = df
-    df_clean
-    return df_clean, mood_map
+def __(HABITS_PATH, dashboard_data, get_snapshot, refresh, set_snapshot):
+    ### Swap in the data refreshed in the background
+
+    # Every tick, straight from memory; the cells below only rerun if it's newer
+    refresh.value
+    _latest = dashboard_data(HABITS_PATH)
+    if _latest is not get_snapshot():
+        set_snapshot(_latest)
+    return
 
 
 @app.cell
-def __(df_clean, mo):
-    df_daily = mo.sql(
-        f"""
-        -- Clean up df_clean even more
-
-        select
-            Date as date,
-            strftime(Date, '%a') as day,
-            Name as name,
-            case 
-                when Name in ('Track sleep', 'Track screen')
-                then Quantity::float / 60
-
-                when Name = 'Track steps'
-                then Quantity::float / 1000
-
-                else Quantity::float
-            end as quantity
-        from df_clean
-        where
-            Name not in ('Mark habits', 'Export habits')
-            and Status != 'Skipped'
-            and Date < date_trunc('week', current_date)
-        """
-    )
-    return (df_daily,)
+def __(get_snapshot):
+    ### The daily table
+
+    # Everything below comes from this one snapshot, shared by every session, so only read from it
+    snapshot = get_snapshot()
+    df_daily = snapshot.df_daily
+    df_daily
+    return df_daily, snapshot
 
 
 @app.cell
-def __(df_daily, mo):
-    # Create habits dropdown
-    habits = sorted(df_daily["name"].unique(), reverse=True)
+def __(get_habit, mo, set_habit, snapshot):
+    # Create habits dropdown, keeping the habit picked unless it's gone from the data
+    habits = snapshot.habits
 
-    dd_habits = mo.ui.dropdown(habits, value=habits[0])
+    dd_habits = mo.ui.dropdown(
+        habits, value=get_habit() if get_habit() in habits else habits[0], on_change=set_habit
+    )
     dd_habits
     return dd_habits, habits
 
@@ -118,50 +104,44 @@ def __(df_daily, mo):
 @app.cell
 def __(mo):
     # Create weeks dropdown
-    weeks = ["1", "2", "4", "6", "8"]
+    from habits.windows import WINDOW_WEEKS
+
+    weeks = [str(w) for w in WINDOW_WEEKS]
 
     dd_weeks = mo.ui.dropdown(weeks, value="4")
     dd_weeks
-    return dd_weeks, weeks
+    return WINDOW_WEEKS, dd_weeks, weeks
 
 
 @app.cell
-def __(dd_habits, dd_weeks, df_daily, mo):
-    df_daily_avg = mo.sql(
-        f"""
-        -- Calc moving avg
-
-        select
-            date,
-            day,
-            name,
-            round(quantity, 2) as quantity,
-            round(avg(quantity) over (
-                partition by name
-                order by date
-                rows between '{dd_weeks.value}'::int * 7 - 1 preceding and current row
-            ), 2) as moving_avg
-        from df_daily
-        where name = '{dd_habits.value}'
-        order by date desc
-        """
-    )
+def __(dd_habits, dd_weeks, snapshot):
+    # Look up the precomputed moving avg in the same snapshot the dropdown lists
+    df_daily_avg = snapshot.moving_avgs.get(dd_habits.value, dd_weeks.value)
     return (df_daily_avg,)
 
 
 @app.cell
-def __(alt, dd_habits, dd_weeks, df_daily_avg, mo):
+def __(dd_habits, dd_weeks, df_daily_avg, mo):
     ### Visualise in Altair
 
-    # Prep a bit
-    _df_daily_avg = df_daily_avg.to_pandas()
+    import altair as alt
+    from habits.charts import chart_points, column_mean, enable_vegafusion, mean_rule
+
+    # Optionally evaluate what's left of the specs' transforms in Python too
+    enable_vegafusion()
+
+    # Prep a bit: means over all rows, but only the points drawn go to the browser
     _days_cut = int(dd_weeks.value) * 7
 
-    _df_daily_cut = _df_daily_avg.iloc[:_days_cut]
+    _df_daily_cut = df_daily_avg.head(_days_cut)
+    _df_daily_avg_mean = column_mean(df_daily_avg, "quantity")
+    _df_daily_cut_mean = column_mean(_df_daily_cut, "quantity")
+    _moving_points = chart_points(df_daily_avg, "date", "moving_avg", ["day"])
+    _daily_points = chart_points(_df_daily_cut, "date", "quantity", ["day"])
 
-    # Moving Average Line Chart
+    # Moving Average Line Chart (its data comes from the layer)
     moving_chart = (
-        alt.Chart(_df_daily_avg)
+        alt.Chart()
         .mark_line(color="#067764")
         .encode(
             x="date:T",
@@ -172,39 +152,29 @@ def __(alt, dd_habits, dd_weeks, df_daily_avg, mo):
                     if dd_habits.value.split()[0] != "Track"
                     else alt.Scale(
                         domain=[
-                            _df_daily_avg["moving_avg"].min() * 0.9,
-                            _df_daily_avg["moving_avg"].max() * 1.1,
+                            _moving_points["moving_avg"].min() * 0.9,
+                            _moving_points["moving_avg"].max() * 1.1,
                         ]
                     )
                 ),
             ),
             tooltip=["day", "date:T", alt.Tooltip("moving_avg:Q", format=".2f")],
         )
-        .properties(
-            title=f"Moving {dd_weeks.value}w Avg of {dd_habits.value} | Avg: {_df_daily_avg['quantity'].mean():.2f}",
-            width=400,
-            height=400,
-        )
     )
 
-    # Add dots to easily locate data points
+    # Add dots to easily locate data points (past HABITS_CHART_POINTS only the highs and lows are left)
     moving_dots = (
-        alt.Chart(_df_daily_avg)
+        alt.Chart()
         .mark_point(filled=True, size=25, color="#067764")
         .encode(x="date:T", y="moving_avg:Q")
     )
 
-    # Mean line for Overall Average
-    _df_daily_avg_mean = _df_daily_avg["quantity"].mean()
-    moving_mean = (
-        alt.Chart(_df_daily_avg)
-        .mark_rule(color="red", strokeDash=[5, 5])
-        .encode(y=alt.datum(_df_daily_avg_mean))
-    )
+    # Mean line for Overall Average, drawn once from a single datum
+    moving_mean = mean_rule(_df_daily_avg_mean)
 
     # Daily Quantity Bar Chart (Last 28 Days)
     daily_chart = (
-        alt.Chart(_df_daily_cut)
+        alt.Chart()
         .mark_bar(color="#067764")
         .encode(
             x="date:T",
@@ -216,25 +186,28 @@ def __(alt, dd_habits, dd_weeks, df_daily_avg, mo):
             ),
             tooltip=["day", "date:T", alt.Tooltip("quantity:Q", format=".2f")],
         )
-        .properties(
-            title=f"Last {dd_weeks.value}w of {dd_habits.value} | Avg: {_df_daily_cut['quantity'].mean():.2f}",
-            width=400,
-            height=400,
-        )
     )
 
     # Mean line for Overall Average
-    _df_daily_cut_mean = _df_daily_cut["quantity"].mean()
-    daily_mean = (
-        alt.Chart(_df_daily_cut)
-        .mark_rule(color="red", strokeDash=[5, 5])
-        .encode(y=alt.datum(_df_daily_cut_mean))
-    )
+    daily_mean = mean_rule(_df_daily_cut_mean)
 
-    # Display the chart
-    chart_l = mo.ui.altair_chart(moving_chart + moving_dots + moving_mean).interactive(False)
-    chart_r = mo.ui.altair_chart(daily_chart + daily_mean).interactive(False)
+    # Display the chart, each layer sharing one dataset
+    chart_l = mo.ui.altair_chart(
+        alt.layer(moving_chart, moving_dots, moving_mean, data=_moving_points).properties(
+            title=f"Moving {dd_weeks.value}w Avg of {dd_habits.value} | Avg: {_df_daily_avg_mean:.2f}",
+            width=400,
+            height=400,
+        )
+    ).interactive(False)
+    chart_r = mo.ui.altair_chart(
+        alt.layer(daily_chart, daily_mean, data=_daily_points).properties(
+            title=f"Last {dd_weeks.value}w of {dd_habits.value} | Avg: {_df_daily_cut_mean:.2f}",
+            width=400,
+            height=400,
+        )
+    ).interactive(False)
     return (
+        alt,
         chart_l,
         chart_r,
         daily_chart,
@@ -246,8 +219,22 @@ def __(alt, dd_habits, dd_weeks, df_daily_avg, mo):
 
 
 @app.cell
-def __(dd_habits, dd_weeks, mo):
-    mo.md(f"""# <u>**Stats for {dd_habits.value} | {dd_weeks.value} weeks**</u>""")
+def __(datetime, dd_habits, dd_weeks, mo, refresh, snapshot, timedelta):
+    # Say how recent the data is, and if the export is due an update: checked
+    # on every tick, as a long-lived session outlasts the week it started in
+    refresh.value
+    _now = datetime.now()
+    _start_of_week = (_now - timedelta(days=_now.weekday())).replace(  # Monday at midnight
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    _as_of = f"data as of {snapshot.modified:%a %d %b %H:%M}"
+    if snapshot.modified < _start_of_week:
+        _as_of += ", not updated this week yet"
+    # The refresh has to be on the page to tick
+    mo.hstack(
+        [mo.md(f"""# <u>**Stats for {dd_habits.value} | {dd_weeks.value} weeks**</u> <small>{_as_of}</small>"""), refresh],
+        justify="space-between",
+    )
     return
 
 
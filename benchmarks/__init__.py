@@ -0,0 +1 @@
+"""Benchmarks for the habits-trends pipeline (run with ``python -m benchmarks.<name>``)."""
@@ -0,0 +1,138 @@
+"""Record the scaling benchmark as a baseline and check for regressions against it.
+
+    uv run python -m benchmarks.baseline record [--skip-tiles]
+    uv run python -m benchmarks.baseline compare [--threshold 0.25] [--skip-tiles]
+
+``record`` runs :mod:`benchmarks.scaling` at the sizes given and stores every
+stage's median time and traced peak memory in ``benchmarks/baseline.json``.
+``compare`` runs it again at the baseline's sizes and prints each stage's
+change, exiting with 1 if any took ``--threshold`` longer (or that much more
+memory) than in the baseline. Changes under ``--min-ms`` and ``--min-mb`` are
+treated as noise. Memory is what ``tracemalloc`` sees, so Arrow's and DuckDB's
+own buffers aren't part of it. Timings only compare on the same machine, so
+re-record the baseline when moving to another one.
+
+Tiles dominate the report, so they're never left out silently: ``record``
+refuses to store a run where any tile failed to render (e.g. Kaleido without
+Chrome), and ``compare`` fails if tiles the baseline has timings for fail to
+render now. Where there's no Chrome, ``--skip-tiles`` leaves them out on
+purpose, so the other stages can still be recorded and gated; ``compare``
+says which stages it skipped.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+from benchmarks.scaling import STAGES, format_results, run_sizes
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def machine():
+    """What the timings were taken on."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(baseline, results, threshold=0.25, min_seconds=0.01, min_bytes=2**20):
+    """``(lines, regressions)``: every stage's change and those past ``threshold``."""
+    lines, regressions = [], []
+    for size, old in baseline["sizes"].items():
+        new = results[size]
+        for stage in STAGES:
+            if stage not in old["stages"] or stage not in new["stages"]:
+                where = "the baseline" if stage not in old["stages"] else "this run"
+                lines.append(f"{size + 'x':>5} {stage:<16} skipped, not in {where}")
+                continue
+            if stage == "tiles" and (old["tile_failures"] or new["tile_failures"]):
+                line = (
+                    f"{size + 'x':>5} {stage:<16} failed to render: {old['tile_failures']} in the baseline,"
+                    f" {new['tile_failures']} now  FAILED"
+                )
+                lines.append(line)
+                regressions.append(line)
+                continue
+            for field, unit, scale, floor in (
+                ("seconds", "ms", 1000, min_seconds),
+                ("peak_bytes", "MB", 1 / 2**20, min_bytes),
+            ):
+                before, after = old["stages"][stage][field], new["stages"][stage][field]
+                change = (after - before) / before if before else 0.0
+                regressed = change > threshold and after - before > floor
+                line = (
+                    f"{size + 'x':>5} {stage:<16} {before * scale:>9.1f} {unit} -> {after * scale:>9.1f} {unit}"
+                    f" {change:>+7.0%}{'  REGRESSED' if regressed else ''}"
+                )
+                lines.append(line)
+                if regressed:
+                    regressions.append(line)
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["record", "compare"])
+    parser.add_argument("--path", default=BASELINE_PATH, help="the baseline file")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10], help="sizes to record")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (0.25 is 25%%)")
+    parser.add_argument("--min-ms", type=float, default=10, help="ignore slowdowns smaller than this")
+    parser.add_argument("--min-mb", type=float, default=1, help="ignore memory growth smaller than this")
+    parser.add_argument("--skip-tiles", action="store_true", help="don't render tiles (they need Chrome)")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        results = run_sizes(args.sizes, args.repeat, with_tiles=not args.skip_tiles)
+        print(format_results(results))
+        failures = sum(result["tile_failures"] for result in results.values())
+        if failures:
+            print(
+                f"{failures} tiles failed to render, not recording a baseline with them"
+                " (--skip-tiles leaves them out)",
+                file=sys.stderr,
+            )
+            return 1
+        baseline = {
+            "recorded": datetime.now().isoformat(timespec="seconds"),
+            "repeat": args.repeat,
+            "machine": machine(),
+            "sizes": results,
+        }
+        with open(args.path, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.path}")
+        return 0
+
+    try:
+        with open(args.path) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.path}, record one with `python -m benchmarks.baseline record`", file=sys.stderr)
+        return 1
+    if baseline["machine"] != machine():
+        print(f"Baseline was recorded on {baseline['machine']}, timings may not compare", file=sys.stderr)
+    # Only render tiles if there's something to compare them with
+    with_tiles = not args.skip_tiles and any("tiles" in old["stages"] for old in baseline["sizes"].values())
+    results = run_sizes([int(size) for size in baseline["sizes"]], baseline["repeat"], with_tiles=with_tiles)
+    lines, regressions = compare(
+        baseline, results, args.threshold, args.min_ms / 1000, args.min_mb * 2**20
+    )
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} regressed past {args.threshold:.0%} or failed:\n" + "\n".join(regressions))
+        return 1
+    print(f"\nNo stage regressed past {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
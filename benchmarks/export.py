@@ -0,0 +1,53 @@
+"""Per-tile export cost with and without a warm Kaleido session.
+
+    uv run python -m benchmarks.export --tiles 12
+"""
+
+import argparse
+import io
+import time
+from datetime import date, timedelta
+
+import plotly.io as pio
+
+from habits.export import export_images
+from habits.tiles import build_tile
+
+
+def sample_tiles(n):
+    """``n`` tiles shaped like the weekly report's, on made-up data."""
+    weeks = [date(2024, 1, 1) + timedelta(weeks=i) for i in range(8)]
+    names = ["Track sleep", "Track steps", "No alcohol", "Some reading"]
+    return [
+        build_tile(f"{names[i % len(names)]} {i}", [(i + w) % 5 / 4 for w in range(8)], weeks)
+        for i in range(n)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tiles", type=int, default=12)
+    args = parser.parse_args(argv)
+    figs = sample_tiles(args.tiles)
+
+    # Cold: every export starts and stops its own renderer
+    start = time.perf_counter()
+    for fig in figs:
+        pio.to_image(fig, format="png")
+    cold = (time.perf_counter() - start) / len(figs)
+
+    # Warm: one renderer for the whole batch
+    start = time.perf_counter()
+    errors = export_images(figs, [io.BytesIO() for _ in figs])
+    warm = (time.perf_counter() - start) / len(figs)
+    if any(errors):
+        raise SystemExit(next(e for e in errors if e))
+
+    print(f"tiles:            {len(figs)}")
+    print(f"cold per tile:    {cold * 1000:8.1f} ms")
+    print(f"warm per tile:    {warm * 1000:8.1f} ms")
+    print(f"speed-up:         {cold / warm:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
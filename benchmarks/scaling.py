@@ -0,0 +1,172 @@
+"""How each stage of the reports scales with the size of the export.
+
+    uv run python -m benchmarks.scaling --sizes 1 10 100 --json scaling.json
+
+For every size in :data:`benchmarks.synthetic.SIZES` a synthetic export is
+written to a temporary folder, then loading, cleaning, the daily and weekly
+SQL, moving averages (``app.py``), the heatmap pivot and each figure of
+``alert.py`` are timed on it: the median of ``--repeat`` runs, plus the peak
+``tracemalloc`` sees in one more. Nothing is cached between runs. Tiles are
+rendered in-process unless ``--tile-workers`` says otherwise, and not at all
+with ``--skip-tiles`` (Kaleido needs Chrome for them).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.synthetic import SIZES, write_export
+from habits.clouds import CLOUD_OPTS, render_wordclouds, word_counts
+from habits.data import clean_export, read_export
+from habits.heatmap import heatmap_table, render_heatmap
+from habits.metrics import take_records
+from habits.optimize import display_dpi, display_scale, display_width
+from habits.pipeline import last_week, moods
+from habits.report import figure_png
+from habits.tiles import TILE_SIZE, render_tiles, tile_series
+from habits.warehouse import materialize
+from habits.windows import WINDOW_WEEKS, MovingAverages
+
+STAGES = [
+    "load",
+    "clean",
+    "daily_weekly",
+    "moving_averages",
+    "moods",
+    "heatmap_pivot",
+    "wordclouds",
+    "tiles",
+    "heatmap",
+]
+
+
+def _measure(func, repeat, setup=None):
+    # Median of ``repeat`` untraced runs, then one traced run for the peak
+    # (tracing slows everything down); returns those and the last result
+    seconds = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        result = func(*args)
+        seconds.append(time.perf_counter() - start)
+
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(seconds), "peak_bytes": peak}, result
+
+
+def run_size(path, repeat=1, tile_workers=1, with_tiles=True):
+    """``({stage: {"seconds", "peak_bytes"}}, tile failures)`` for the export at ``path``.
+
+    Without ``with_tiles`` their stage is left out of the timings.
+    """
+    now = datetime.now()
+    timings = {}
+
+    timings["load"], df_raw = _measure(lambda: read_export(path), repeat)
+    timings["clean"], df_clean = _measure(clean_export, repeat, setup=lambda: (df_raw.copy(),))
+    timings["daily_weekly"], (df_daily, df_weekly) = _measure(
+        lambda: materialize(df_clean, ":memory:"), repeat
+    )
+
+    def moving_averages():
+        averages = MovingAverages(df_daily)
+        return [averages.get(habit, weeks) for habit in averages.index.offsets for weeks in WINDOW_WEEKS]
+
+    timings["moving_averages"], _ = _measure(moving_averages, repeat)
+    timings["moods"], df_moods = _measure(lambda: moods(df_clean), repeat)
+    timings["heatmap_pivot"], heatmap_data = _measure(
+        lambda: heatmap_table(last_week(df_daily, now)), repeat
+    )
+
+    def wordclouds():
+        pixels = display_width("wordclouds")
+        scale = display_scale(CLOUD_OPTS["width"], pixels / 2)
+        fig = render_wordclouds(word_counts(last_week(df_moods, now)), scale)
+        return figure_png(fig, dpi=display_dpi(fig, pixels), bbox_inches="tight")
+
+    def tiles():
+        scale = display_scale(TILE_SIZE, display_width("tile"))
+        return render_tiles(tile_series(df_weekly), workers=tile_workers, scale=scale)
+
+    def heatmap():
+        fig = render_heatmap(heatmap_data)
+        return figure_png(fig, dpi=display_dpi(fig, display_width("heatmap")), bbox_inches="tight")
+
+    timings["wordclouds"], _ = _measure(wordclouds, repeat)
+    tile_errors = []
+    if with_tiles:
+        timings["tiles"], (_, tile_errors) = _measure(tiles, repeat)
+    timings["heatmap"], _ = _measure(heatmap, repeat)
+
+    take_records()  # The pipeline's own metrics aren't wanted here
+    return timings, len(tile_errors)
+
+
+def run_sizes(sizes, repeat=3, tile_workers=1, with_tiles=True):
+    """Results for each of ``sizes``, keyed by the size as a string (as in JSON)."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            years, habits = SIZES[size]
+            path = os.path.join(tmp, f"AwesomeHabits-{size}x.csv")
+            rows = write_export(path, years, habits)
+            stages, tile_failures = run_size(path, repeat, tile_workers, with_tiles)
+            results[str(size)] = {
+                "years": years,
+                "habits": habits,
+                "rows": rows,
+                "tile_failures": tile_failures,
+                "stages": stages,
+            }
+            if tile_failures:
+                print(f"{size}x: {tile_failures} tiles failed to render (is Chrome installed for Kaleido?)")
+    return results
+
+
+def format_results(results):
+    """Table of every stage's median time and traced peak, one column per size."""
+    lines = [
+        f"{'stage':<16}" + "".join(f"{size + 'x':>22}" for size in results),
+        f"{'rows':<16}" + "".join(f"{r['rows']:>22}" for r in results.values()),
+    ]
+    for stage in STAGES:
+        cells = "".join(
+            f"{r['stages'][stage]['seconds'] * 1000:>9.1f} ms {r['stages'][stage]['peak_bytes'] / 2**20:>6.1f} MB"
+            if stage in r["stages"]
+            else f"{'skipped':>22}"
+            for r in results.values()
+        )
+        lines.append(f"{stage:<16}{cells}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tile-workers", type=int, default=1)
+    parser.add_argument("--skip-tiles", action="store_true", help="don't render tiles (they need Chrome)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run_sizes(args.sizes, args.repeat, args.tile_workers, not args.skip_tiles)
+    print(format_results(results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sizes": results}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Cold import cost per package, and how fast a stale export is rejected.
+
+    uv run python -m benchmarks.startup --stale alert.py
+
+Every package is imported in a fresh interpreter with ``-X importtime``, so
+each figure includes everything it pulls in. ``--stale`` also runs the given
+notebook against a copy of ``HABITS_PATH`` dated a year back.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MODULES = [
+    "marimo",
+    "dotenv",
+    "habits.ready",
+    "pandas",
+    "pyarrow.csv",
+    "polars",
+    "duckdb",
+    "numpy",
+    "matplotlib.pyplot",
+    "plotly.graph_objects",
+    "kaleido",
+    "wordcloud",
+    "PIL.Image",
+    "altair",
+    "habits.cache",
+    "habits.warehouse",
+    "habits.tiles",
+    "habits.heatmap",
+]
+
+
+def import_time(module):
+    """Cumulative cold import time of ``module`` in seconds (``None`` if it fails)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
+    # The last line is the module itself, with everything it imported
+    last = [line for line in result.stderr.splitlines() if line.startswith("import time:")][-1]
+    return int(last.split("|")[1]) / 1e6
+
+
+def stale_run(notebook):
+    """Seconds until ``notebook`` gives up on an export last modified a year ago."""
+    with tempfile.TemporaryDirectory() as tmp:
+        stale = os.path.join(tmp, os.path.basename(os.environ["HABITS_PATH"]))
+        shutil.copyfile(os.environ["HABITS_PATH"], stale)
+        year_ago = time.time() - 365 * 24 * 3600
+        os.utime(stale, (year_ago, year_ago))
+
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, notebook],
+            env={**os.environ, "HABITS_PATH": stale, "HABITS_READY_TIMEOUT": "1"},
+            capture_output=True,
+        )
+        return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--stale", metavar="NOTEBOOK", help="also time a stale run of it")
+    args = parser.parse_args(argv)
+
+    width = max(map(len, args.modules))
+    for module in args.modules:
+        seconds = import_time(module)
+        timing = "   not installed" if seconds is None else f"{seconds * 1000:8.1f} ms"
+        print(f"{module:<{width}}  {timing}")
+
+    if args.stale:
+        print(f"\nstale {args.stale}: {stale_run(args.stale):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Synthetic Awesome Habits exports of any size.
+
+    uv run python -m benchmarks.synthetic AwesomeHabits.csv --years 2 --habits 12
+
+Writes one row per habit per day, oldest first, with the same columns as the
+real export: ``Track ...`` habits with quantities (sleep and screen time in
+minutes, steps, anything else as a small count), yes/no habits as 1/0 (some
+of them ``No ...`` or ``... screen`` ones), a daily ``Track mood`` with an
+Apple Health mood plus labels and associations, and the odd ``Mark habits``
+row the reports ignore. Everything is drawn from a seeded generator, so the
+same arguments always give the same file.
+"""
+
+import argparse
+import csv
+from datetime import date, timedelta
+
+import numpy as np
+
+from habits.data import MOOD_MAP
+
+COLUMNS = ["Date", "Name", "Status", "Quantity", "Mood Labels", "Mood Associations"]
+
+# Quantity (mean, spread) of the tracked habits, in the units the export uses
+TRACKED = {
+    "Track sleep": (450, 60),
+    "Track screen": (190, 70),
+    "Track steps": (8000, 3000),
+}
+BINARY = [
+    "No alcohol",
+    "Read",
+    "Workout",
+    "Meditate",
+    "No sugar",
+    "Stretch",
+    "Less screen",
+    "Journal",
+    "No snooze",
+]
+MOOD_LABELS = [
+    "Happy", "Calm", "Content", "Grateful", "Hopeful", "Stressed",
+    "Tired", "Anxious", "Irritated", "Excited", "Confident", "Drained",
+]
+MOOD_ASSOCIATIONS = [
+    "Work", "Family", "Health", "Fitness", "Friends", "Partner",
+    "Weather", "Hobbies", "Money", "Self care", "Travel", "Education",
+]
+
+# Export size multiples and the (years, habits) behind them
+SIZES = {1: (2, 12), 10: (10, 24), 100: (25, 96)}
+
+
+def habit_names(habits):
+    """``habits`` names: mood and the known tracked ones first, then yes/no ones."""
+    names = ["Track mood", *TRACKED, *BINARY]
+    names += [f"Track metric {i}" if i % 3 == 0 else f"Habit {i}" for i in range(len(names), habits)]
+    return names[:habits]
+
+
+def _mood_text(rng, words, n):
+    picks = [rng.choice(words, size=rng.integers(1, 4), replace=False) for _ in range(n)]
+    return [", ".join(p) for p in picks]
+
+
+def generate_rows(years=2, habits=12, seed=0, end=None, date_format="%Y-%m-%d"):
+    """Yield the export's rows (without the header), day by day."""
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    days = [end - timedelta(days=i) for i in range(round(years * 365), -1, -1)]
+    names = habit_names(habits)
+    moods = list(MOOD_MAP)
+
+    # Draw all the randomness up front, one column per habit
+    statuses = rng.choice(["Done", "Not done", "Skipped"], p=[0.7, 0.22, 0.08], size=(len(days), len(names)))
+    noise = rng.standard_normal(size=(len(days), len(names)))
+    mood_scores = np.clip(np.round(rng.normal(2.5, 1.3, size=len(days))), 0, len(moods) - 1).astype(int)
+    mood_labels = _mood_text(rng, MOOD_LABELS, len(days))
+    mood_assocs = _mood_text(rng, MOOD_ASSOCIATIONS, len(days))
+    marks = rng.random(len(days)) < 0.05
+
+    for d, day in enumerate(days):
+        stamp = day.strftime(date_format)
+        for h, name in enumerate(names):
+            status = statuses[d, h]
+            if name == "Track mood":
+                row = [moods[mood_scores[d]], mood_labels[d], mood_assocs[d]]
+                if status == "Skipped":
+                    row = ["", "", ""]
+            elif status == "Skipped":
+                row = ["", "", ""]
+            elif name.startswith("Track"):
+                mean, spread = TRACKED.get(name, (5, 2))
+                row = [str(max(0, round(mean + spread * noise[d, h]))), "", ""]
+            else:
+                row = ["1" if status == "Done" else "0", "", ""]
+            yield [stamp, name, status, *row]
+        if marks[d]:
+            yield [stamp, "Mark habits", "Done", "1", "", ""]
+
+
+def write_export(path, years=2, habits=12, seed=0, end=None, date_format="%Y-%m-%d"):
+    """Write a synthetic export to ``path``; returns the number of rows."""
+    rows = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in generate_rows(years, habits, seed, end, date_format):
+            writer.writerow(row)
+            rows += 1
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--habits", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--date-format", default="%Y-%m-%d", help="e.g. '%%d %%b %%Y' for older exports")
+    args = parser.parse_args(argv)
+    rows = write_export(args.path, args.years, args.habits, args.seed, date_format=args.date_format)
+    print(f"Wrote {rows} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
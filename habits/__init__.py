@@ -0,0 +1,22 @@
+"""Shared helpers behind the habits-trends notebooks.
+
+The re-exports below are resolved on first use, so importing a light
+submodule (e.g. :mod:`habits.ready`) doesn't pull in pandas and pyarrow.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "MOOD_MAP": "habits.data",
+    "clean_export": "habits.data",
+    "load_clean": "habits.cache",
+    "read_export": "habits.data",
+}
+
+__all__ = ["MOOD_MAP", "clean_export", "load_clean", "read_export"]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
@@ -0,0 +1,87 @@
+"""Persistent cache of rendered report images, keyed by their inputs.
+
+Most weeks only some figures actually change, and a re-run after a failed send
+changes none of them. :class:`ArtifactCache` stores each rendered PNG under a
+hash of exactly what went into it (the trend and weeks of a tile, the pivot of
+the heatmap, the word counts of the clouds) plus its renderer's version and
+settings. Matching figures are copied back instead of rendered again.
+
+Entries live in ``artifacts`` in the cache directory, are evicted least
+recently used first once they exceed ``HABITS_ARTIFACT_MAX_MB`` and are
+bypassed when ``HABITS_CACHE=0`` or ``HABITS_ARTIFACT_MAX_MB=0``. That's the
+price of reuse: a cached run reads the unchanged figures back and writes the
+new ones, while a bypassed one renders everything without touching the disk.
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from habits.cache import cache_dir_for, cache_enabled, evict, replacing
+
+DEFAULT_MAX_MB = 64
+
+
+def _digest_part(digest, part):
+    if isinstance(part, bytes):
+        digest.update(part)
+    elif isinstance(part, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        if isinstance(part, pd.DataFrame):
+            digest.update(json.dumps(list(map(str, part.columns))).encode())
+    else:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+
+
+def artifact_key(kind, *parts):
+    """Hash of an artifact's kind and everything it's rendered from."""
+    digest = hashlib.blake2b(kind.encode(), digest_size=16)
+    for part in parts:
+        _digest_part(digest, part)
+    return f"{kind}-{digest.hexdigest()}"
+
+
+class ArtifactCache:
+    """Rendered files stored by :func:`artifact_key`."""
+
+    def __init__(self, directory, max_mb=None, enabled=None):
+        self.directory = directory
+        if max_mb is None:
+            max_mb = float(os.getenv("HABITS_ARTIFACT_MAX_MB", DEFAULT_MAX_MB))
+        self.enabled = (cache_enabled() and max_mb > 0) if enabled is None else enabled
+        self.max_bytes = max_mb * 1024 * 1024
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def for_export(cls, path, **kwargs):
+        """Cache living next to the given export's data cache."""
+        return cls(os.path.join(cache_dir_for(path), "artifacts"), **kwargs)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """Bytes of a cached artifact, or ``None`` if there is none."""
+        if not self.enabled:
+            return None
+        try:
+            os.utime(self._path(key))  # Mark as recently used
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:  # Not there, or just evicted by another process
+            return None
+
+    def put(self, key, data):
+        """Keep a copy of a freshly rendered artifact."""
+        if not self.enabled:
+            return
+        with replacing(self._path(key), shared=True) as tmp_path, open(tmp_path, "wb") as f:
+            f.write(data)
+        self.evict(keep=(os.path.basename(self._path(key)),))
+
+    def evict(self, keep=()):
+        """Drop least recently used artifacts until the cache fits in its cap."""
+        evict(self.directory, self.max_bytes, keep=keep, suffix=".png")
@@ -0,0 +1,203 @@
+"""Content-addressed Parquet cache for the cleaned export.
+
+Entries live in ``.habits-cache`` next to the export (or ``HABITS_CACHE_DIR``)
+and are named after a hash of the export's bytes, so the same content always
+maps to the same entry. A small ``index.json`` remembers the mtime and size the
+hash was computed for:
+
+* if the export's mtime and size still match the index, the stored hash is
+  trusted and the file is not read at all;
+* otherwise the export is hashed again, and an entry is reused only if the
+  content hash matches (e.g. a re-sync that touched the mtime only);
+* bumping ``CACHE_VERSION`` invalidates every entry written by older code.
+
+After each write, least recently used entries (counting each export's
+incremental store as one) are evicted until the directory fits in
+``HABITS_CACHE_MAX_MB``. Set ``HABITS_CACHE=0`` to bypass it entirely,
+or ``HABITS_INGEST=incremental`` to use the append-only store in
+:mod:`habits.ingest` instead.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from habits.env import env_flag
+
+CACHE_VERSION = 2
+DEFAULT_MAX_MB = 256
+INDEX_FILE = "index.json"
+
+# Temporary files are created private, the files they become shouldn't be
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def cache_enabled():
+    """Whether the cache is switched on (``HABITS_CACHE``, default on)."""
+    return env_flag("HABITS_CACHE", default=True)
+
+
+def cache_dir_for(path):
+    """Directory holding the cache entries for a given export."""
+    return os.getenv("HABITS_CACHE_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(path)), ".habits-cache"
+    )
+
+
+@contextmanager
+def replacing(path, shared=False):
+    """Path to write ``path``'s new content to, swapped in only once it's complete.
+
+    Every writer gets a temporary file of its own, as several processes may
+    write the same file at once. With ``shared`` the content is the same
+    whoever writes it (it's content-addressed), so a writer finding ``path``
+    already there keeps that and drops its own copy.
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=f".{name}.", suffix=".tmp")
+    os.close(fd)
+    os.chmod(tmp_path, 0o666 & ~_UMASK)
+    try:
+        yield tmp_path
+        if not (shared and os.path.exists(path)):
+            os.replace(tmp_path, path)
+    finally:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """Hash the file's content in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path, index=None):
+    """Return ``(mtime_ns, size, content_hash)`` for the export.
+
+    The hash is taken from ``index`` when mtime and size are unchanged.
+    """
+    stat = os.stat(path)
+    known = (index or {}).get(os.path.abspath(path))
+    if known and known["mtime_ns"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+        return stat.st_mtime_ns, stat.st_size, known["hash"]
+    return stat.st_mtime_ns, stat.st_size, hash_file(path)
+
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(cache_dir, index):
+    with replacing(os.path.join(cache_dir, INDEX_FILE)) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(index, f)
+
+
+def _dir_usage(path):
+    # A directory entry is as recent as its newest file
+    mtime, size = 0, 0
+    for name in os.listdir(path):
+        stat = os.stat(os.path.join(path, name))
+        mtime, size = max(mtime, stat.st_mtime), size + stat.st_size
+    return mtime, size
+
+
+def evict(cache_dir, max_bytes, keep=(), suffix=".parquet", dir_prefix=None):
+    """Drop least recently used entries until the cache fits in ``max_bytes``.
+
+    Entries are files ending with ``suffix`` (if given) and, if ``dir_prefix``
+    is given, whole directories starting with it.
+    """
+    entries, total = [], 0
+    for name in os.listdir(cache_dir):
+        entry_path = os.path.join(cache_dir, name)
+        try:
+            if suffix and name.endswith(suffix):
+                stat = os.stat(entry_path)
+                mtime, size = stat.st_mtime, stat.st_size
+            elif dir_prefix is not None and name.startswith(dir_prefix) and os.path.isdir(entry_path):
+                mtime, size = _dir_usage(entry_path)
+            else:
+                continue
+        except FileNotFoundError:  # Evicted by someone else meanwhile
+            continue
+        total += size
+        if name not in keep:
+            entries.append((mtime, size, name))
+
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        entry_path = os.path.join(cache_dir, name)
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path, ignore_errors=True)
+        else:
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def load_clean(path, enabled=None, cache_dir=None, max_mb=None):
+    """Return the cleaned export, reusing a cached copy when the file is unchanged."""
+    # Imported here so the directory helpers above don't pull in pandas and pyarrow
+    import pandas as pd
+
+    from habits.data import clean_export, read_export
+    from habits.ingest import STORE_PREFIX, ingest_enabled, load_incremental, store_dir_for
+
+    if enabled is None:
+        enabled = cache_enabled()
+    if not enabled:
+        return clean_export(read_export(path))
+
+    cache_dir = cache_dir or cache_dir_for(path)
+    if max_mb is None:
+        max_mb = float(os.getenv("HABITS_CACHE_MAX_MB", DEFAULT_MAX_MB))
+    max_bytes = max_mb * 1024 * 1024
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Parse only the newly appended rows if asked to
+    if ingest_enabled():
+        df_clean = load_incremental(path, cache_dir)
+        store_name = os.path.basename(store_dir_for(path, cache_dir))
+        evict(cache_dir, max_bytes, keep=(store_name,), dir_prefix=STORE_PREFIX)
+        return df_clean
+
+    # Look up the entry for the current content
+    index = _read_index(cache_dir)
+    mtime_ns, size, content_hash = fingerprint(path, index)
+    entry_name = f"{content_hash}-v{CACHE_VERSION}.parquet"
+    entry_path = os.path.join(cache_dir, entry_name)
+
+    try:
+        os.utime(entry_path)  # Mark as recently used
+        df_clean = pd.read_parquet(entry_path)
+    except FileNotFoundError:  # Not there yet, or just evicted by another process
+        df_clean = None
+    if df_clean is None:
+        df_clean = clean_export(read_export(path))
+        with replacing(entry_path, shared=True) as tmp_path:
+            df_clean.to_parquet(tmp_path, index=False)
+        evict(cache_dir, max_bytes, keep=(entry_name,), dir_prefix=STORE_PREFIX)
+
+    # Only rewritten when something changed, so warm loads don't write at all
+    entry = {"mtime_ns": mtime_ns, "size": size, "hash": content_hash}
+    if index.get(os.path.abspath(path)) != entry:
+        index[os.path.abspath(path)] = entry
+        _write_index(cache_dir, index)
+    return df_clean
@@ -0,0 +1,89 @@
+"""Only the data the dashboard's Altair charts actually draw.
+
+Altair embeds a chart's data in the Vega-Lite spec sent to the browser, so the
+moving average, its dots and its mean line used to ship the selected habit's
+whole history, every column of it, three times over. :func:`chart_points`
+keeps just the columns a chart encodes and the rows it can draw (no missing
+values). Past ``HABITS_CHART_POINTS`` rows (default 500) it keeps the lowest
+and highest point of each of that many halved buckets along the x axis, so the
+line keeps its shape and extremes while the spec stays the same size however
+many years of history there are. The layers of each chart share that one
+dataset, and means are computed here and drawn from a single datum.
+
+With ``HABITS_VEGAFUSION=1`` (and vegafusion installed) the transforms left in
+the specs are evaluated in Python as well, and only their results reach the
+browser.
+"""
+
+import math
+import os
+
+from habits.env import env_flag
+
+DEFAULT_MAX_POINTS = 500
+
+
+def max_points():
+    """Most rows a chart ships (``HABITS_CHART_POINTS``, default 500)."""
+    return int(os.getenv("HABITS_CHART_POINTS", 0)) or DEFAULT_MAX_POINTS
+
+
+def chart_points(df, x, y, columns=(), limit=None):
+    """The rows of the polars ``df`` a chart of ``y`` over ``x`` draws, as pandas.
+
+    Only ``x``, ``y`` and ``columns`` (e.g. for tooltips) are kept, and at most
+    ``limit`` rows (default :func:`max_points`).
+    """
+    import polars as pl
+
+    limit = limit or max_points()
+    df = df.select(x, y, *columns).with_columns(pl.col(y).fill_nan(None)).drop_nulls(y)
+
+    # Keep both extremes of each bucket of neighbouring rows
+    if df.height > limit:
+        buckets = limit // 2
+        extremes = (
+            df.with_row_index("_row")
+            .group_by((pl.col("_row") * buckets // df.height).alias("_bucket"))
+            .agg(
+                pl.col("_row").get(pl.col(y).arg_min()).alias("low"),
+                pl.col("_row").get(pl.col(y).arg_max()).alias("high"),
+            )
+        )
+        rows = pl.concat([extremes["low"], extremes["high"]]).unique().sort()
+        df = df[rows.to_list()]
+    return df.to_pandas()
+
+
+def column_mean(df, column):
+    """Mean of a polars column, NaN (as pandas gives) rather than ``None`` if it has no values."""
+    mean = df[column].mean()
+    return float("nan") if mean is None else mean
+
+
+def mean_rule(mean):
+    """Dashed red rule at ``mean``, drawn once from a single datum (not at all for NaN)."""
+    import altair as alt
+
+    drawn = not math.isnan(mean)
+    return (
+        alt.Chart(alt.Data(values=[{}] if drawn else []))
+        .mark_rule(color="red", strokeDash=[5, 5])
+        .encode(y=alt.datum(mean if drawn else 0))
+    )
+
+
+def enable_vegafusion():
+    """Evaluate chart transforms in Python if ``HABITS_VEGAFUSION`` asks for it; returns whether it's on."""
+    if not env_flag("HABITS_VEGAFUSION"):
+        return False
+    try:
+        import vegafusion  # noqa: F401
+    except ImportError:
+        print("HABITS_VEGAFUSION is set but vegafusion isn't installed, so charts are transformed in the browser")
+        return False
+
+    import altair as alt
+
+    alt.data_transformers.enable("vegafusion")
+    return True
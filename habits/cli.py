@@ -0,0 +1,109 @@
+"""``habits-report``: build and send the weekly report without marimo.
+
+    uv run habits-report [--dry-run]
+
+Runs the same stages as ``alert.py`` (see :mod:`habits.pipeline`) in a plain
+interpreter, the independent ones side by side, printing how long each one
+took. Exits with 0 once the email is sent, 3 if the export is stale, 4 if
+sending it failed, 5 if it went out without some of its tiles (e.g. when
+Kaleido found no Chrome to render them with) and 1 on any other error. ``--watch`` keeps running
+instead, sending the report every Monday (see :mod:`habits.daemon`).
+"""
+
+import argparse
+import os
+import sys
+import time
+import traceback
+from datetime import datetime
+
+from habits import pipeline
+from habits.imports import import_report
+from habits.metrics import format_records, save_run, start_tracing
+from habits.profiling import start_profiling
+from habits.stages import StageFailed, print_timing, run_stages
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_STALE = 3
+EXIT_SEND = 4
+EXIT_TILES = 5
+
+
+def run(path, now, send=True, output_folder=None):
+    """Run every stage of the report; returns the exit code."""
+    stages = [stage for stage in pipeline.REPORT_STAGES if send or stage.name != "send"]
+    values = {
+        "path": path,
+        "now": now,
+        "output_folder": output_folder,
+        "email": os.getenv("EMAIL"),
+        "password": os.getenv("PASSWORD"),
+    }
+
+    start_tracing()
+    start_profiling()
+    run_start, start = time.time(), time.perf_counter()
+    code = EXIT_OK
+    try:
+        values = run_stages(stages, values, on_done=print_timing)
+        if values["tile_errors"]:
+            print(f"Failed to render {len(values['tile_errors'])} of the tiles", file=sys.stderr)
+            code = EXIT_TILES
+    except StageFailed as e:
+        # Not a failure of the report, so without the StageFailed around it
+        if isinstance(e.__cause__, pipeline.StaleExportError):
+            raise e.__cause__ from None
+        if e.stage != "send":
+            raise
+        print(f"Failed to send email: {e.__cause__}", file=sys.stderr)
+        code = EXIT_SEND
+    finally:
+        # Failed runs are worth graphing too
+        records, summary = save_run(path, run_start)
+
+    print(f"Done in {time.perf_counter() - start:.2f} s")
+    print(f"Stages:\n{format_records(records)}")
+    print(f"Import times:\n{import_report()}")
+    if summary:
+        print(f"Profiles:\n{summary}")
+    return code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="habits-report", description=__doc__.splitlines()[0])
+    parser.add_argument("--path", help="the Awesome Habits export (default: HABITS_PATH)")
+    parser.add_argument("--dry-run", action="store_true", help="build the report without sending it")
+    parser.add_argument(
+        "--watch", action="store_true", help="stay running, refresh as the export changes and report every Monday"
+    )
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    path = args.path or os.getenv("HABITS_PATH")
+    if not path:
+        parser.error("no export to report on, set HABITS_PATH or pass --path")
+
+    if args.watch:
+        from habits.daemon import ReportDaemon
+
+        daemon = ReportDaemon(path, send=not args.dry_run, output_folder=os.getenv("OUTPUT_FOLDER"))
+        try:
+            daemon.run_forever()
+        except KeyboardInterrupt:
+            return EXIT_OK
+
+    try:
+        return run(path, datetime.now(), send=not args.dry_run, output_folder=os.getenv("OUTPUT_FOLDER"))
+    except pipeline.StaleExportError as e:
+        print(e, file=sys.stderr)
+        return EXIT_STALE
+    except Exception:
+        traceback.print_exc()
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
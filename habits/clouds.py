@@ -0,0 +1,60 @@
+"""Word clouds of last week's mood labels and associations."""
+
+from collections import Counter
+
+from matplotlib.figure import Figure
+from wordcloud import WordCloud
+
+# Create word cloud configurations
+CLOUD_CONFIGS = [
+    {
+        "data_column": "mood_labels",
+        "title": "Mood Labels",
+        "colormap": "viridis",
+        "subplot_pos": 1,
+    },
+    {
+        "data_column": "mood_assocs",
+        "title": "Mood Associations",
+        "colormap": "cividis",
+        "subplot_pos": 2,
+    },
+]
+CLOUD_OPTS = {
+    "width": 800,
+    "height": 400,
+    "background_color": "white",
+    "contour_width": 1,
+    "contour_color": "black",
+    "prefer_horizontal": 1.0,
+    "margin": 10,
+}
+
+
+def word_counts(df_moods):
+    """How often each word shows up in every configured column."""
+    # Split and count words
+    return {
+        config["data_column"]: Counter(
+            df_moods[config["data_column"]].fillna("").str.split(", ").explode().tolist()
+        )
+        for config in CLOUD_CONFIGS
+    }
+
+
+def render_wordclouds(counts, scale, figsize=(16, 12)):
+    """Draw the clouds side by side, each rendered at ``scale`` times its layout."""
+    # Display both word clouds, on a figure of their own so they can be drawn from any thread
+    fig = Figure(figsize=figsize)
+
+    for config in CLOUD_CONFIGS:
+        # Create word cloud
+        wordcloud = WordCloud(
+            colormap=config["colormap"], scale=scale, **CLOUD_OPTS
+        ).generate_from_frequencies(counts[config["data_column"]])
+
+        # Plot
+        ax = fig.add_subplot(1, 2, config["subplot_pos"])
+        ax.imshow(wordcloud, interpolation="bilinear")
+        ax.axis("off")
+    return fig
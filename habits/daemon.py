@@ -0,0 +1,193 @@
+"""``habits-report --watch``: one warm process instead of a cold start a week.
+
+Run from ``launchd`` or cron, every report starts from scratch: imports,
+reading the export and all the SQL. :class:`ReportDaemon` instead loads the
+export once and then sleeps until it changes, refreshing the data
+(:data:`~habits.pipeline.DATA_STAGES`, which only redo what changed: see
+``HABITS_INGEST``, :mod:`habits.warehouse` and :mod:`habits.artifacts`) and,
+once the export is fresh enough for the next report, rendering its figures
+ahead of time. On Monday, once the grace period is over, the report goes out
+with whatever is already rendered; if the export is stale by then it goes out
+as soon as the export is updated.
+
+The last week reported is kept in ``daemon.json`` in the cache directory, so
+restarting doesn't send it twice. Started for the first time after this
+week's report was due, the daemon waits for next week's.
+"""
+
+import json
+import os
+import time
+import traceback
+from datetime import date, datetime, timedelta
+
+from habits import pipeline
+from habits.cache import cache_dir_for, replacing
+from habits.metrics import save_run, start_tracing
+from habits.profiling import start_profiling
+from habits.ready import wait_for_change
+from habits.stages import StageFailed, print_timing, run_stages
+
+STATE_FILE = "daemon.json"
+# How long to sleep at most, so a laptop waking up notices the report is due
+MAX_SLEEP = 60.0
+RETRY_SEND = timedelta(minutes=15)
+
+
+def week_start(now):
+    """Monday midnight of ``now``'s week."""
+    return datetime.combine(now.date() - timedelta(days=now.weekday()), datetime.min.time())
+
+
+def report_due(now):
+    """When this week's report is due: Monday, once the grace period is over."""
+    return week_start(now) + pipeline.GRACE_PERIOD
+
+
+def _signature(stat):
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ReportDaemon:
+    """Keeps the report for ``path`` warm and sends it every week."""
+
+    def __init__(self, path, send=True, output_folder=None):
+        self.path = path
+        self.send = send
+        self.output_folder = output_folder
+        self.state_path = os.path.join(cache_dir_for(path), STATE_FILE)
+        self.data, self.data_for = {}, None
+        self.figures, self.figures_for = {}, None
+        self.retry_at = None
+        self.reported = self._read_state()
+
+    def _read_state(self):
+        try:
+            with open(self.state_path) as f:
+                return date.fromisoformat(json.load(f)["reported"])
+        except (FileNotFoundError, KeyError, ValueError):
+            # Don't send a report that may have gone out before the daemon ran
+            now = datetime.now()
+            return week_start(now).date() if now >= report_due(now) else None
+
+    def _write_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with replacing(self.state_path) as tmp_path, open(tmp_path, "w") as f:
+            json.dump({"reported": self.reported.isoformat()}, f)
+
+    def _run(self, stages, values):
+        # Every batch of stages gets its metrics (and profiles) written, failed or not
+        run_start = time.time()
+        try:
+            return run_stages(stages, values, on_done=print_timing)
+        finally:
+            save_run(self.path, run_start)
+
+    def refresh(self, due, now=None):
+        """Bring the data, and the figures of the report due at ``due``, up to date.
+
+        Without ``due`` (or if the export isn't fresh enough for it) only the
+        data gets refreshed, up to the week of ``now`` (default: the current one).
+        """
+        if due:
+            file_stat, now = pipeline.check_fresh(self.path, due), due
+        else:
+            # Not fresh enough for a report, but keep the data warm anyway
+            now = now or datetime.now()
+            try:
+                file_stat = pipeline.check_fresh(self.path, now)
+            except pipeline.StaleExportError:
+                file_stat = os.stat(self.path)
+
+        # The tables only hold complete weeks, so they depend on when they're for too
+        data_for = (_signature(file_stat), week_start(now))
+        if data_for != self.data_for:
+            self.data = self._run(pipeline.DATA_STAGES, {"path": self.path, "now": now})
+            self.data_for = data_for
+            print(f"Data refreshed from the export of {datetime.fromtimestamp(file_stat.st_mtime)}")
+
+        if due and self.figures_for != (self.data_for, due):
+            self.figures = self._run(pipeline.FIGURE_STAGES, self.data)
+            self.figures_for = (self.data_for, due)
+            print(f"Figures ready for the report due {due}")
+
+    def _fresh_for(self, due, now):
+        try:
+            self.refresh(due)
+            return True
+        except pipeline.StaleExportError:
+            self.refresh(None, now)
+            return False
+
+    def report(self, due, now=None):
+        """Send the report due at ``due`` if the export is fresh enough; returns whether it went out."""
+        now = now or datetime.now()
+        if not self._fresh_for(due, now):
+            print(f"The export is stale, the report due {due} goes out once it's updated")
+            return False
+
+        values = {
+            **self.figures,
+            "output_folder": self.output_folder,
+            "email": os.getenv("EMAIL"),
+            "password": os.getenv("PASSWORD"),
+        }
+        stages = [stage for stage in pipeline.DELIVERY_STAGES if self.send or stage.name != "send"]
+        try:
+            self._run(stages, values)
+        except StageFailed as e:
+            if e.stage != "send":
+                raise
+            print(f"Failed to send email: {e.__cause__}, trying again in {RETRY_SEND}")
+            self.retry_at = now + RETRY_SEND
+            return False
+
+        self.reported, self.retry_at = week_start(due).date(), None
+        self._write_state()
+        return True
+
+    def _next_due(self, now):
+        due = report_due(now)
+        if self.reported is not None and self.reported >= week_start(now).date():
+            due += timedelta(weeks=1)
+        return due
+
+    def step(self, now):
+        """Send the report if it's due, otherwise prepare it; returns when to wake up next."""
+        due = self._next_due(now)
+        if now >= due and (self.retry_at is None or now >= self.retry_at):
+            if self.report(due, now):
+                return self._next_due(now)
+        elif now < due:
+            # Render ahead if the export is already good for the next report
+            self._fresh_for(due, now)
+        return self.retry_at if now >= due else due
+
+    def run_forever(self):
+        """Prepare and send reports until interrupted."""
+        start_tracing()
+        start_profiling()
+        while True:
+            try:
+                wake = self.step(datetime.now())
+            except Exception:
+                # Keep running and try again once the export changes
+                traceback.print_exc()
+                wake = None
+            print(f"Watching {self.path}" + (f" until {wake:%a %d %b %H:%M}" if wake else ""))
+
+            while True:
+                sleep = MAX_SLEEP if wake is None else (wake - datetime.now()).total_seconds()
+                sleep = max(0.0, min(sleep, MAX_SLEEP))
+                try:
+                    changed = wait_for_change(self.path, sleep)
+                except OSError:
+                    # e.g. the export's folder went away while syncing, so just sleep instead
+                    traceback.print_exc()
+                    time.sleep(sleep)
+                    changed = False
+                if changed:
+                    print("The export changed")
+                    break
+                if wake is not None and datetime.now() >= wake:
+                    break
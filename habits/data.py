@@ -0,0 +1,92 @@
+"""Reading and cleaning the Awesome Habits CSV export."""
+
+import csv
+import io
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Map mood from Apple Health
+MOOD_MAP = {
+    "Very pleasant": "3",
+    "Pleasant": "2",
+    "Slightly pleasant": "1",
+    "Neutral": "0",
+    "Slightly unpleasant": "-1",
+    "Unpleasant": "-2",
+    "Very unpleasant": "-3",
+}
+
+# Date formats used by the exports over time (newest first)
+DATE_FORMATS = ("%Y-%m-%d", "%d %b %Y")
+
+# Declared schema, so Arrow doesn't have to infer anything
+COLUMN_TYPES = {
+    "Name": pa.dictionary(pa.int32(), pa.string()),
+    "Status": pa.dictionary(pa.int32(), pa.string()),
+    "Quantity": pa.string(),  # Kept as text until moods are mapped
+    "Mood Labels": pa.string(),
+    "Mood Associations": pa.string(),
+}
+
+
+def _head(source, size=64 * 1024):
+    # Peek at the start of a path or a seekable binary buffer
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            return f.read(size)
+    position = source.tell()
+    head = source.read(size)
+    source.seek(position)
+    return head
+
+
+def detect_date_format(head):
+    """Return which of ``DATE_FORMATS`` the ``Date`` column uses."""
+    rows = csv.DictReader(io.StringIO(head.decode("utf-8", errors="ignore")))
+    for row in rows:
+        if not row.get("Date"):
+            continue
+        for date_format in DATE_FORMATS:
+            try:
+                datetime.strptime(row["Date"], date_format)
+                return date_format
+            except ValueError:
+                pass
+        raise ValueError(f"Unknown date format in the export: {row['Date']!r}")
+    return DATE_FORMATS[0]
+
+
+def read_export(source):
+    """Read the raw export with the multithreaded Arrow CSV reader.
+
+    ``Date`` comes back as dates whichever format the file uses, ``Name`` and
+    ``Status`` as categoricals and everything else as text.
+    """
+    date_format = detect_date_format(_head(source))
+    column_types = {
+        **COLUMN_TYPES,
+        "Date": pa.date32() if date_format == "%Y-%m-%d" else pa.timestamp("s"),
+    }
+
+    table = pacsv.read_csv(
+        source,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types=column_types,
+            timestamp_parsers=[date_format],
+            strings_can_be_null=True,
+        ),
+    )
+    if table.schema.field("Date").type != pa.date32():
+        table = table.set_column(
+            table.schema.get_field_index("Date"), "Date", table["Date"].cast(pa.date32())
+        )
+    return table.to_pandas()
+
+
+def clean_export(df):
+    """Turn Apple Health mood labels into scores."""
+    df["Quantity"] = df["Quantity"].map(MOOD_MAP).combine_first(df["Quantity"])
+    return df
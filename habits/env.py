@@ -0,0 +1,18 @@
+"""Switches read from the environment."""
+
+import os
+
+TRUE = ("1", "true", "yes", "on")
+FALSE = ("0", "false", "no", "off")
+
+
+def env_flag(name, default=False):
+    """Whether the environment variable ``name`` turns something on.
+
+    When it's on by ``default``, anything but an explicit no keeps it on;
+    otherwise it takes an explicit yes.
+    """
+    value = os.getenv(name, "").lower()
+    if not value:
+        return default
+    return value not in FALSE if default else value in TRUE
@@ -0,0 +1,81 @@
+"""Batch Plotly image export through a single warm Kaleido session.
+
+Each ``fig.write_image`` call starts a fresh Kaleido (and with it Chromium)
+and tears it down again afterwards. :func:`export_images` keeps one renderer
+running for a whole batch of figures instead, writing each one to a path or a
+binary buffer. On Kaleido releases before 1.0 the renderer is already kept
+alive between calls, so the session is a no-op there.
+"""
+
+import os
+from contextlib import contextmanager
+
+import plotly.io as pio
+
+_sessions = 0
+_renderer_found = None
+
+
+def _renderer_available():
+    # A sync server without a browser starts fine but never answers, so check
+    # for one up front, once: Kaleido itself refuses to be created without it
+    global _renderer_found
+    if _renderer_found is None:
+        import kaleido
+
+        try:
+            kaleido.Kaleido()
+            _renderer_found = True
+        except Exception:
+            _renderer_found = False
+    return _renderer_found
+
+
+@contextmanager
+def kaleido_session():
+    """Keep one Kaleido renderer running for the duration of the block."""
+    global _sessions
+    import kaleido
+
+    start = getattr(kaleido, "start_sync_server", None)
+    if start is None or not _renderer_available():
+        yield
+        return
+
+    # Only the outermost session starts and stops the renderer
+    if _sessions == 0:
+        start(silence_warnings=True)
+    _sessions += 1
+    try:
+        yield
+    finally:
+        _sessions -= 1
+        if _sessions == 0:
+            kaleido.stop_sync_server(silence_warnings=True)
+
+
+def export_images(figs, targets, format="png", strict=False, **kwargs):
+    """Export ``figs`` to ``targets`` (paths or binary buffers) in one session.
+
+    Returns one entry per figure: ``None`` if it was exported, or the error
+    message if it wasn't, so one bad figure doesn't stop the rest. With
+    ``strict`` the first error is raised instead, as ``fig.write_image`` would.
+    """
+    if not figs:  # Don't start a browser for nothing
+        return []
+    errors = []
+    with kaleido_session():
+        for fig, target in zip(figs, targets):
+            try:
+                data = pio.to_image(fig, format=format, **kwargs)
+                if isinstance(target, (str, os.PathLike)):
+                    with open(target, "wb") as f:
+                        f.write(data)
+                else:
+                    target.write(data)
+                errors.append(None)
+            except Exception as e:
+                if strict:
+                    raise
+                errors.append(f"{type(e).__name__}: {' '.join(str(e).split())}")
+    return errors
@@ -0,0 +1,108 @@
+"""Weekly habit heatmap drawn from a single colour matrix.
+
+Instead of a ``Normalize`` per row plus a ``Rectangle`` and a text per cell,
+the colour of every cell is computed at once with NumPy: rows of ``Track ...``
+metrics are scaled between their own min and max, everything else between 0
+and 1, and ``No ...``/``... screen`` rows are flipped so that less is greener.
+The whole matrix is then drawn with one ``imshow``, leaving the cell labels as
+the only per-cell artists.
+
+Those labels are not batched: matplotlib has no artist drawing many strings
+at once, and turning them into one collection of glyph paths would render the
+digits differently from the rest of the text. Drawing them still grows with
+the number of cells, but that's habits times seven, not the history's length.
+"""
+
+import matplotlib
+import numpy as np
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.figure import Figure
+
+# Bump whenever render_heatmap draws something different
+HEATMAP_VERSION = 1
+
+# Colour for rows with nothing to scale against
+BLANK = (1, 1, 1, 0.5)
+
+DAY_ORDER = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def pastel_cmap():
+    """RdYlGn at 50% opacity."""
+    # Adjust the transparency (alpha) of the colormap
+    base_cmap = matplotlib.colormaps.get_cmap("RdYlGn")
+    colors = base_cmap(np.linspace(0, 1, 256))  # Extract original colours
+    colors[:, -1] = 0.5  # Set alpha transparency to 50%
+    return LinearSegmentedColormap.from_list("PastelRdYlGn", colors)
+
+
+def heatmap_colors(data, metrics, cmap):
+    """RGBA colour for every cell of ``data`` (metrics as rows)."""
+    data = np.asarray(data, dtype=float)
+    track = np.array([m.split()[0] == "Track" for m in metrics])[:, None]
+    inverted = np.array([m.startswith("No") or m.endswith("screen") for m in metrics])[:, None]
+
+    # Only normalize "track" metrics relative to their row
+    vmin = np.where(track, data.min(axis=1, keepdims=True), 0.0)
+    vmax = np.where(track, data.max(axis=1, keepdims=True), 1.0)
+
+    # Invert colour for some metrics, then scale like Normalize would
+    adjusted = np.where(inverted, vmax + vmin - data, data)
+    span = vmax - vmin
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scaled = np.where(span == 0, 0.0, (adjusted - vmin) / span)
+
+    colors = cmap(scaled)
+    colors[~(vmax > 0).repeat(data.shape[1], axis=1)] = BLANK
+    return colors
+
+
+def heatmap_table(df_daily):
+    """Mean quantity per habit (rows, Z to A) and weekday (columns, Mon to Sun)."""
+    # Pivot the data to create a matrix of `quantity` values with `day` as columns and `name` as rows
+    heatmap_data = df_daily.pivot_table(
+        index="name", columns="day", values="quantity", aggfunc="mean"
+    ).fillna(0)
+
+    # Sort days in week order, metrics in decreasing alphabetical order
+    heatmap_data = heatmap_data.reindex(columns=DAY_ORDER)
+    return heatmap_data.sort_index(ascending=False)
+
+
+def render_heatmap(heatmap_data, figsize=(12, 8), cmap=None):
+    """Draw a metrics x days pivot table as an annotated heatmap."""
+    metrics = heatmap_data.index.tolist()
+    days = heatmap_data.columns.tolist()
+    data_matrix = heatmap_data.to_numpy(dtype=float)
+    colors = heatmap_colors(data_matrix, metrics, cmap or pastel_cmap())
+
+    # Create the heatmap in one go, on a figure of its own (not pyplot's) so it can be drawn from any thread
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    ax.imshow(
+        colors,
+        extent=(0, len(days), len(metrics), 0),
+        aspect="auto",
+        interpolation="nearest",
+    )
+
+    # Label every cell with its value, one text each (see the module docstring)
+    labels = np.char.mod("%.1f", data_matrix)
+    for (i, j), label in np.ndenumerate(labels):
+        ax.text(j + 0.5, i + 0.5, label, ha="center", va="center", color="black")
+
+    # Configure axis labels and ticks
+    ax.set_xticks(np.arange(len(days)) + 0.5)
+    ax.set_yticks(np.arange(len(metrics)) + 0.5)
+    ax.set_xticklabels(days)
+    ax.set_yticklabels(metrics)
+    ax.set_xlim(0, len(days))
+    ax.set_ylim(0, len(metrics))
+    ax.invert_yaxis()
+
+    # Add grid lines
+    ax.set_xticks(np.arange(len(days)), minor=True)
+    ax.set_yticks(np.arange(len(metrics)), minor=True)
+    ax.grid(which="minor", color="black", linestyle="-", linewidth=0.5)
+    ax.tick_params(which="minor", size=0)
+    return fig
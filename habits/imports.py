@@ -0,0 +1,58 @@
+"""Deferred imports and what they cost at startup.
+
+The notebooks import each heavy library in the stage that first needs it, so
+a run that stops early (say, on a stale export) never pays for the rest.
+Wrapping those imports in :func:`import_timer` records how long each stage
+spent importing and which packages that pulled in, and :func:`import_report`
+formats it. Stages running side by side (see :mod:`habits.stages`) can see
+each other's imports, so their figures are only indicative; the bookkeeping
+itself is safe to share between them.
+``python -m benchmarks.startup`` measures each package's cold import on its
+own.
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Stage -> (seconds spent importing, third-party packages first loaded)
+IMPORT_TIMES = {}
+_lock = threading.Lock()
+
+
+def _packages():
+    # Copied in one step, as other threads may be importing meanwhile
+    return {name.partition(".")[0] for name in sys.modules.copy()}
+
+
+@contextmanager
+def import_timer(stage):
+    """Record the time and the new third-party packages imported inside the block."""
+    before = _packages()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        loaded = _packages() - before
+        with _lock:
+            seconds, packages = IMPORT_TIMES.get(stage, (0.0, []))
+            IMPORT_TIMES[stage] = (
+                seconds + elapsed,
+                sorted({*packages, *(name for name in loaded - sys.stdlib_module_names if name[0] != "_")}),
+            )
+
+
+def import_report():
+    """Table of import time per stage, in the order the stages ran."""
+    with _lock:
+        times = dict(IMPORT_TIMES)
+    width = max(map(len, [*times, "total"]))
+    lines = [
+        f"{stage:<{width}}  {seconds * 1000:7.0f} ms  {', '.join(packages)}"
+        for stage, (seconds, packages) in times.items()
+    ]
+    total = sum(seconds for seconds, _ in times.values())
+    lines.append(f"{'total':<{width}}  {total * 1000:7.0f} ms")
+    return "\n".join(lines)
@@ -0,0 +1,172 @@
+"""Incremental ingestion of append-growing exports.
+
+Every Awesome Habits export is the full history, but a new one only differs
+from the previous one by the rows added at the end. With ``HABITS_INGEST=incremental``
+the cleaned rows are kept as Parquet parts in the cache directory, together with
+a small state file recording how many bytes and rows were ingested, a hash of
+those bytes and the last date seen (the watermark).
+
+On the next load only the bytes past the recorded offset are parsed and
+appended as a new part. Everything is reloaded from scratch when:
+
+* the header or the already ingested prefix changed (e.g. an old entry edited),
+* the file shrank or the stored parts don't add up to the recorded row count,
+* the new tail contains rows dated before the watermark.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from habits.cache import replacing
+from habits.data import COLUMN_TYPES, clean_export, read_export
+
+INGEST_VERSION = 3
+MAX_PARTS = 32
+STORE_PREFIX = "ingest-"
+STATE_FILE = "state.json"
+
+
+def ingest_enabled():
+    """Whether incremental ingestion is switched on (``HABITS_INGEST``)."""
+    return os.getenv("HABITS_INGEST", "").lower() == "incremental"
+
+
+def store_dir_for(path, cache_dir):
+    """Directory holding the ingested parts for a given export."""
+    key = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=8).hexdigest()
+    return os.path.join(cache_dir, f"{STORE_PREFIX}{key}")
+
+
+def _hash_prefix(f, length, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    while length > 0 and (chunk := f.read(min(chunk_size, length))):
+        digest.update(chunk)
+        length -= len(chunk)
+    return digest
+
+
+def _parts(store_dir):
+    return sorted(
+        os.path.join(store_dir, name)
+        for name in os.listdir(store_dir)
+        if name.startswith("part-") and name.endswith(".parquet")
+    )
+
+
+def _read_state(store_dir):
+    try:
+        with open(os.path.join(store_dir, STATE_FILE)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == INGEST_VERSION else None
+
+
+def _write_state(store_dir, state):
+    with replacing(os.path.join(store_dir, STATE_FILE)) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(state, f)
+
+
+def _write_part(store_dir, df, number):
+    with replacing(os.path.join(store_dir, f"part-{number:05d}.parquet")) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
+
+
+def _concat(frames):
+    # Keep the categoricals a full load gives, whatever categories each part has
+    df = pd.concat(frames, ignore_index=True)
+    for column, dtype in COLUMN_TYPES.items():
+        if pa.types.is_dictionary(dtype) and len(frames) > 1:
+            df[column] = union_categoricals([frame[column] for frame in frames])
+    return df
+
+
+def _read_parts(store_dir):
+    return _concat([pd.read_parquet(part) for part in _parts(store_dir)])
+
+
+def _watermark(df):
+    return df["Date"].iloc[-1].isoformat()
+
+
+def _full_reload(store_dir, f):
+    # Start over with a single part
+    f.seek(0)
+    data = f.read()
+    header = data[: data.index(b"\n") + 1] if b"\n" in data else data
+    for part in _parts(store_dir):
+        os.remove(part)
+
+    df_clean = clean_export(read_export(io.BytesIO(data)))
+    _write_part(store_dir, df_clean, 0)
+    _write_state(store_dir, {
+        "version": INGEST_VERSION,
+        "header": header.decode(),
+        "offset": len(data),
+        "prefix_hash": hashlib.blake2b(data, digest_size=16).hexdigest(),
+        "rows": len(df_clean),
+        "watermark": _watermark(df_clean) if len(df_clean) else None,
+    })
+    return df_clean
+
+
+def load_incremental(path, cache_dir):
+    """Return the cleaned export, parsing only what was appended since the last load."""
+    store_dir = store_dir_for(path, cache_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    state = _read_state(store_dir)
+
+    with open(path, "rb") as f:
+        header = f.readline()
+        if (
+            not state
+            or state["header"] != header.decode()
+            or os.fstat(f.fileno()).st_size < state["offset"]
+        ):
+            return _full_reload(store_dir, f)
+
+        # Check the stored prefix is still what's at the start of the file
+        f.seek(0)
+        digest = _hash_prefix(f, state["offset"])
+        stored_rows = sum(pq.read_metadata(part).num_rows for part in _parts(store_dir))
+        if digest.hexdigest() != state["prefix_hash"] or stored_rows != state["rows"]:
+            return _full_reload(store_dir, f)
+
+        # Nothing new since the last load
+        tail = f.read()
+        if not tail.strip():
+            return _read_parts(store_dir)
+
+        # Parse the tail only and make sure it really comes after the watermark
+        df_tail = clean_export(read_export(io.BytesIO(header + tail)))
+        watermark = state["watermark"]
+        if watermark and len(df_tail) and df_tail["Date"].min().isoformat() < watermark:
+            return _full_reload(store_dir, f)
+        digest.update(tail)
+
+    # Append the tail as a new part, compacting once there are too many
+    parts = _parts(store_dir)
+    if len(parts) >= MAX_PARTS:
+        df_clean = _concat([_read_parts(store_dir), df_tail])
+        for part in parts:
+            os.remove(part)
+        _write_part(store_dir, df_clean, 0)
+    else:
+        _write_part(store_dir, df_tail, len(parts))
+        df_clean = None
+
+    _write_state(store_dir, {
+        **state,
+        "offset": state["offset"] + len(tail),
+        "prefix_hash": digest.hexdigest(),
+        "rows": state["rows"] + len(df_tail),
+        "watermark": _watermark(df_tail) if len(df_tail) else watermark,
+    })
+    return df_clean if df_clean is not None else _read_parts(store_dir)
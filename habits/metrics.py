@@ -0,0 +1,222 @@
+"""Per-stage timing, memory and row counts of the weekly report.
+
+Every stage in :mod:`habits.pipeline` is wrapped in :func:`measured`, which
+records its wall time, CPU time (of the thread it ran on), the process's peak
+RSS so far, the peak traced by ``tracemalloc`` during the stage (when
+``HABITS_TRACEMALLOC=1`` turns tracing on) and the rows of the data frames
+going in and coming out. :func:`write_metrics` appends them to
+``metrics.jsonl`` and rewrites ``habits_report.prom`` (a Prometheus textfile
+for node_exporter) in ``HABITS_METRICS_DIR``, by default ``metrics`` in the
+cache directory. Once ``metrics.jsonl`` passes ``HABITS_METRICS_MAX_MB``
+(default 16) it's rotated to ``metrics.jsonl.1``, replacing the one before.
+
+Stages run side by side share a process, so while they overlap their RSS and
+``tracemalloc`` peaks include each other. ``HABITS_PROFILE`` also profiles
+every stage (see :mod:`habits.profiling`); the clocks only start once a stage's
+profiler is running, so waiting for another stage's profile isn't counted, but
+the profiler's own overhead is, and such records name the ``profiler`` used.
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from habits.cache import cache_dir_for, cache_enabled, replacing
+from habits.env import env_flag
+from habits.profiling import (
+    active_profiler,
+    profile_dir_for,
+    stage_profile,
+    take_profiles,
+    write_profiles,
+)
+
+PROM_FILE = "habits_report.prom"
+JSONL_FILE = "metrics.jsonl"
+DEFAULT_MAX_MB = 16
+
+_records = []
+_lock = threading.Lock()
+
+
+def tracing_requested():
+    """Whether to trace allocations (``HABITS_TRACEMALLOC``)."""
+    return env_flag("HABITS_TRACEMALLOC")
+
+
+def start_tracing():
+    """Start ``tracemalloc`` if it was asked for and isn't running yet."""
+    if tracing_requested() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def max_rss():
+    """Peak resident set size of this process so far, in bytes (``None`` on Windows)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kB
+
+
+def count_rows(*values):
+    """Total rows of the pandas or polars frames among ``values``."""
+    total = 0
+    for value in values:
+        if isinstance(value, tuple):
+            total += count_rows(*value)
+        elif len(getattr(value, "shape", ())) == 2:
+            total += value.shape[0]
+    return total
+
+
+def measured(func):
+    """Record a metrics entry for every call of ``func``, failed ones included."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Profilers may have to wait for each other, so time the stage once they're on
+        with stage_profile(func.__name__):
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            record = {
+                "stage": func.__name__,
+                "start": time.time(),
+                "rows_in": count_rows(*args, *kwargs.values()),
+                "profiler": active_profiler(),
+            }
+            wall, cpu = time.perf_counter(), time.thread_time()
+            result, ok = None, False
+            try:
+                result = func(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                record.update(
+                    ok=ok,
+                    wall_seconds=time.perf_counter() - wall,
+                    cpu_seconds=time.thread_time() - cpu,
+                    max_rss_bytes=max_rss(),
+                    traced_peak_bytes=tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+                    rows_out=count_rows(result),
+                )
+                with _lock:
+                    _records.append(record)
+
+    return wrapper
+
+
+def take_records():
+    """The records so far, leaving none behind for the next run."""
+    with _lock:
+        records = list(_records)
+        _records.clear()
+    return records
+
+
+def metrics_dir_for(path):
+    """Where to write metrics (``HABITS_METRICS_DIR``, else ``metrics`` in the cache).
+
+    ``None`` if neither is there, i.e. with ``HABITS_CACHE=0``.
+    """
+    if os.getenv("HABITS_METRICS_DIR"):
+        return os.getenv("HABITS_METRICS_DIR")
+    return os.path.join(cache_dir_for(path), "metrics") if cache_enabled() else None
+
+
+def format_records(records):
+    """Table of every stage's numbers, in the order they finished."""
+    lines = [f"{'stage':<16} {'wall':>9} {'cpu':>9} {'max rss':>9} {'rows in':>9} {'rows out':>9}"]
+    for r in records:
+        rss = "" if r["max_rss_bytes"] is None else f"{r['max_rss_bytes'] / 2**20:.0f} MB"
+        lines.append(
+            f"{r['stage'] + ('' if r['ok'] else ' !'):<16} {r['wall_seconds'] * 1000:6.0f} ms"
+            f" {r['cpu_seconds'] * 1000:6.0f} ms {rss:>9} {r['rows_in']:>9} {r['rows_out']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def _prometheus(records, run_start):
+    # Stages called more than once (e.g. last_week) are summed into one series
+    stages = {}
+    for r in records:
+        s = stages.setdefault(
+            r["stage"], {"wall": 0.0, "cpu": 0.0, "rss": 0, "traced": 0, "in": 0, "out": 0, "ok": 1}
+        )
+        s["wall"] += r["wall_seconds"]
+        s["cpu"] += r["cpu_seconds"]
+        s["rss"] = max(s["rss"], r["max_rss_bytes"] or 0)
+        s["traced"] = max(s["traced"], r["traced_peak_bytes"] or 0)
+        s["in"] += r["rows_in"]
+        s["out"] += r["rows_out"]
+        s["ok"] &= int(r["ok"])
+
+    metrics = [
+        ("habits_stage_wall_seconds", "Wall time of each report stage", "wall"),
+        ("habits_stage_cpu_seconds", "CPU time of each report stage", "cpu"),
+        ("habits_stage_max_rss_bytes", "Peak RSS of the process after each report stage", "rss"),
+        ("habits_stage_traced_peak_bytes", "Peak memory traced by tracemalloc during each report stage", "traced"),
+        ("habits_stage_rows_in", "Data frame rows going into each report stage", "in"),
+        ("habits_stage_rows_out", "Data frame rows coming out of each report stage", "out"),
+        ("habits_stage_ok", "Whether each report stage succeeded", "ok"),
+    ]
+    lines = []
+    for name, help_text, field in metrics:
+        lines += [f"# HELP {name} {help_text}.", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{stage="{stage}"}} {values[field]}' for stage, values in stages.items()]
+    lines += [
+        "# HELP habits_report_profiled Whether the last report run was profiled, which slows it down.",
+        "# TYPE habits_report_profiled gauge",
+        f"habits_report_profiled {int(any(r.get('profiler') for r in records))}",
+        "# HELP habits_report_last_run_timestamp_seconds When the last report run started.",
+        "# TYPE habits_report_last_run_timestamp_seconds gauge",
+        f"habits_report_last_run_timestamp_seconds {run_start:.0f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _rotate(jsonl_path):
+    # Keep the log and one older part, so it never grows past twice the cap
+    max_bytes = float(os.getenv("HABITS_METRICS_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+    try:
+        if os.path.getsize(jsonl_path) >= max_bytes:
+            os.replace(jsonl_path, f"{jsonl_path}.1")
+    except FileNotFoundError:
+        pass
+
+
+def write_metrics(records, directory, run_start):
+    """Append ``records`` to the JSON lines log and replace the Prometheus textfile.
+
+    Nothing is written without a ``directory``.
+    """
+    if directory is None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _rotate(os.path.join(directory, JSONL_FILE))
+    run = datetime.fromtimestamp(run_start).isoformat(timespec="seconds")
+    with open(os.path.join(directory, JSONL_FILE), "a") as f:
+        for record in records:
+            f.write(json.dumps({"run": run, **record}) + "\n")
+
+    # Write next to it and swap, so the collector never reads half a file
+    with replacing(os.path.join(directory, PROM_FILE)) as tmp_path, open(tmp_path, "w") as f:
+        f.write(_prometheus(records, run_start))
+
+
+def save_run(path, run_start):
+    """Write the run's metrics and any profiles; returns the records and the profiles' summary."""
+    records = take_records()
+    write_metrics(records, metrics_dir_for(path), run_start)
+    profiles = take_profiles()
+    summary = write_profiles(profiles, profile_dir_for(path), run_start) if profiles else None
+    return records, summary
@@ -0,0 +1,92 @@
+"""Sizing and compressing report images for how they're actually displayed.
+
+The email shows tiles at 200px and the heatmap and word clouds at 800px, so
+rendering them any larger only costs time and bytes. :func:`display_width`
+gives the pixels to render each kind at, times ``HABITS_HIDPI`` (default 1; 2
+keeps them sharp on Retina screens), and :func:`display_scale` and
+:func:`display_dpi` the export scale or DPI that gets them there.
+:func:`optimize_images` then recompresses the PNGs according to
+``HABITS_PNG``: ``lossless`` (default) re-encodes them with Pillow's optimizer
+and keeps whichever is smaller, ``palette`` quantizes them to 256 colours and
+``off`` leaves them alone.
+"""
+
+import io
+import os
+
+# Widths (in CSS pixels) the report shows each kind of image at
+DISPLAY_WIDTHS = {"tile": 200, "wordclouds": 800, "heatmap": 800}
+
+PNG_MODES = ("lossless", "palette", "off")
+
+
+def hidpi():
+    """Pixel density multiplier (``HABITS_HIDPI``, default 1)."""
+    return float(os.getenv("HABITS_HIDPI", 1)) or 1.0
+
+
+def png_mode():
+    """How to recompress PNGs (``HABITS_PNG``, default ``lossless``)."""
+    mode = os.getenv("HABITS_PNG", "lossless").lower()
+    if mode not in PNG_MODES:
+        raise ValueError(f"HABITS_PNG must be one of {', '.join(PNG_MODES)}, not {mode!r}")
+    return mode
+
+
+def display_width(kind):
+    """Pixels to render a ``kind`` of image at, HiDPI multiplier included."""
+    return round(DISPLAY_WIDTHS[kind] * hidpi())
+
+
+def display_scale(width, pixels):
+    """Scale to export something laid out ``width`` pixels wide at to get ``pixels``."""
+    return pixels / width
+
+
+def display_dpi(fig, pixels, pad_inches=0.1):
+    """DPI at which a matplotlib figure saved with a tight bounding box is ``pixels`` wide."""
+    width = fig.get_tightbbox().width + 2 * pad_inches
+    return pixels / width
+
+
+def optimize_png(data, mode="lossless"):
+    """Recompress PNG bytes; never returns anything larger in lossless mode."""
+    if mode == "off":
+        return data
+    from PIL import Image  # Only needed once there's something to optimize
+
+    with Image.open(io.BytesIO(data)) as image:
+        if mode == "palette":
+            # Octree is the only quantizer that keeps the alpha channel
+            method = Image.Quantize.FASTOCTREE if image.mode == "RGBA" else None
+            image = image.quantize(256, method=method)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+    optimized = buffer.getvalue()
+    return optimized if mode == "palette" or len(optimized) < len(data) else data
+
+
+def optimize_images(images, mode=None):
+    """Recompress a dict of PNG bytes.
+
+    Returns ``(images, sizes)``, where ``sizes`` maps every name to its byte
+    count ``(before, after)``.
+    """
+    mode = mode or png_mode()
+    optimized, sizes = {}, {}
+    for name, data in images.items():
+        optimized[name] = optimize_png(data, mode)
+        sizes[name] = (len(data), len(optimized[name]))
+    return optimized, sizes
+
+
+def format_sizes(sizes):
+    """Table of per-image sizes before and after, plus a total."""
+    width = max(map(len, [*sizes, "total"]))
+    before, after = (sum(size[i] for size in sizes.values()) for i in (0, 1))
+    lines = [
+        f"{name:<{width}}  {b / 1024:8.1f} kB -> {a / 1024:8.1f} kB  ({a / b - 1:+.0%})"
+        for name, (b, a) in {**sizes, "total": (before, after)}.items()
+        if b
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,43 @@
+"""Sorted partition index over a polars frame.
+
+Filtering a frame once per habit rescans all of it every time. A
+:class:`PartitionIndex` sorts the frame by a key column and an order column
+once and records where each key's rows start and end, so any habit's rows (or
+just its last few) are a zero-copy slice.
+"""
+
+import numpy as np
+
+
+class PartitionIndex:
+    """``df`` sorted by ``(key, order)`` plus a table of per-key offsets."""
+
+    def __init__(self, df, key="name", order="week"):
+        self.df = df.sort(key, order, maintain_order=True)
+
+        keys = self.df[key].to_numpy()
+        is_start = np.ones(len(keys), dtype=bool)
+        is_start[1:] = keys[1:] != keys[:-1]
+        self.starts = np.flatnonzero(is_start)
+        self.ends = np.append(self.starts[1:], len(keys))
+        self.offsets = {keys[s]: (s, e) for s, e in zip(self.starts, self.ends)}
+
+    @property
+    def keys(self):
+        """Keys in sorted order."""
+        return list(self.offsets)
+
+    def rows(self, key):
+        """All rows for ``key``, ordered."""
+        start, end = self.offsets.get(key, (0, 0))
+        return self.df.slice(start, end - start)
+
+    def tail(self, key, n):
+        """The last ``n`` rows for ``key``, ordered."""
+        start, end = self.offsets.get(key, (0, 0))
+        start = max(start, end - n)
+        return self.df.slice(start, end - start)
+
+    def group_starts(self):
+        """For every row, the position where its key's rows start."""
+        return np.repeat(self.starts, self.ends - self.starts)
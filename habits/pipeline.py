@@ -0,0 +1,301 @@
+"""The weekly report as a sequence of plain functions.
+
+Every stage takes what the earlier ones returned, so the same steps back both
+the ``alert.py`` notebook and the headless ``habits-report`` command
+(:mod:`habits.cli`). Each stage imports its heavy libraries itself, under
+:func:`~habits.imports.import_timer`, so a stale export is rejected before
+any of them load. Every stage is also :func:`~habits.metrics.measured`.
+
+:data:`REPORT_STAGES` wires them up for :func:`~habits.stages.run_stages`,
+which renders the word clouds, tiles and heatmap (:data:`FIGURE_STAGES`)
+side by side.
+"""
+
+from datetime import datetime, timedelta
+
+from habits.imports import import_timer
+from habits.metrics import measured
+from habits.ready import wait_until_ready
+from habits.stages import Stage
+
+# Allow a grace period before week start
+GRACE_PERIOD = timedelta(hours=3)
+
+MOODS_SQL = """
+-- Transform mood labels
+
+select
+    Date as date,
+    "Mood Labels" as mood_labels,
+    "Mood Associations" as mood_assocs
+from df_clean
+where
+    Name = 'Track mood'
+    and Status != 'Skipped'
+"""
+
+
+class StaleExportError(RuntimeError):
+    """The export hasn't been updated since the start of the week."""
+
+
+@measured
+def check_fresh(path, now):
+    """Wait for the export to finish syncing and make sure it's from this week.
+
+    Returns its ``os.stat_result``; raises :class:`StaleExportError` if it
+    was last modified before Monday midnight (less the grace period).
+    """
+    # Wait for iCloud to finish syncing the file, then get its modification time
+    file_stat = wait_until_ready(path)
+    file_mod_time = datetime.fromtimestamp(file_stat.st_mtime)
+
+    # Calculate the start of the current week (Monday at midnight)
+    start_of_week = now - timedelta(days=now.weekday())  # Get Monday
+    start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)  # Set to midnight
+
+    # Check if the file has been modified recently enough
+    if file_mod_time < start_of_week - GRACE_PERIOD:
+        raise StaleExportError("The file has not been updated this week. Update the file and try again.")
+    return file_stat
+
+
+@measured
+def load(path):
+    """The cleaned export (served from the cache when it's unchanged)."""
+    with import_timer("load"):
+        import habits.ingest  # noqa: F401, pandas and pyarrow for load_clean
+        from habits import load_clean
+
+    return load_clean(path)
+
+
+@measured
+def tables(df_clean, path, now=None):
+    """``(df_daily, df_weekly)`` up to the week of ``now``, refreshed in the export's DuckDB."""
+    with import_timer("warehouse"):
+        from habits.warehouse import db_path_for, materialize
+
+    # Only rows since the last refresh get recomputed in the on-disk DuckDB
+    return materialize(df_clean, db_path_for(path), now)
+
+
+@measured
+def moods(df_clean):
+    """Mood labels and associations of every tracked (not skipped) day."""
+    with import_timer("warehouse"):
+        import duckdb
+
+    con = duckdb.connect()
+    con.register("df_clean", df_clean)
+    return con.sql(MOODS_SQL).pl()
+
+
+@measured
+def last_week(df, now):
+    """The rows of a polars frame from Monday to Sunday of last week, as pandas."""
+    import polars as pl
+
+    # Prep dates
+    lw_end = datetime.combine(now - timedelta(days=now.weekday() + 1), datetime.max.time())
+    lw_start = datetime.combine(lw_end - timedelta(days=6), datetime.min.time())
+
+    # Filter and transform the DataFrame
+    df_lw = df.filter((pl.col("date") >= lw_start) & (pl.col("date") <= lw_end))
+    return df_lw.to_pandas()
+
+
+@measured
+def artifact_cache(path):
+    """Cache of rendered images next to the export's data cache."""
+    with import_timer("report"):
+        from habits.artifacts import ArtifactCache
+
+    return ArtifactCache.for_export(path)
+
+
+@measured
+def wordclouds(df_moods_lw, artifacts):
+    """PNG of last week's mood word clouds."""
+    with import_timer("wordclouds"):
+        from habits.artifacts import artifact_key
+        from habits.clouds import CLOUD_CONFIGS, CLOUD_OPTS, render_wordclouds, word_counts
+        from habits.optimize import display_dpi, display_scale, display_width
+        from habits.report import figure_png
+
+    # Render at the size they're shown at, each cloud taking half of the width
+    pixels = display_width("wordclouds")
+    scale = display_scale(CLOUD_OPTS["width"], pixels / 2)
+    counts = word_counts(df_moods_lw)
+
+    # Reuse the last render if the words and settings are unchanged
+    key = artifact_key("wordclouds", CLOUD_CONFIGS, CLOUD_OPTS, scale, pixels, counts)
+    png = artifacts.get(key)
+    if png is not None:
+        print("Wordclouds reused from cache!")
+        return png
+
+    # Render straight to memory
+    fig = render_wordclouds(counts, scale)
+    png = figure_png(fig, dpi=display_dpi(fig, pixels), bbox_inches="tight")
+    artifacts.put(key, png)
+    print(f"Wordclouds rendered ({len(png) / 1024:.0f} kB)!")
+    return png
+
+
+@measured
+def tiles(df_weekly, artifacts):
+    """``(images, errors)`` of every habit's tile, keyed by habit."""
+    with import_timer("tiles"):
+        from habits.optimize import display_scale, display_width
+        from habits.tiles import TILE_SIZE, render_tiles, tile_series
+
+    # Render new tiles across a process pool at the size they're shown at, keeping only those that worked
+    scale = display_scale(TILE_SIZE, display_width("tile"))
+    tile_images, tile_errors = render_tiles(tile_series(df_weekly), cache=artifacts, scale=scale)
+    print(f"Habit tiles ready: {len(tile_images)}!")
+    for habit, error in tile_errors.items():
+        print(f"Failed to render tile for {habit}: {error}")
+    return tile_images, tile_errors
+
+
+@measured
+def sheet(tile_images):
+    """``(png, areas)`` of the tiles' contact sheet, or ``(None, None)`` if it's off."""
+    with import_timer("sheet"):
+        from habits.sheet import contact_sheet, sheet_enabled
+
+    # One image (and MIME part) for all tiles instead of one per habit
+    if not (sheet_enabled() and tile_images):
+        return None, None
+    png, areas = contact_sheet(tile_images)
+    print(f"Contact sheet composited ({len(png) / 1024:.0f} kB)!")
+    return png, areas
+
+
+@measured
+def heatmap(df_daily_lw, artifacts):
+    """PNG of last week's habit heatmap."""
+    with import_timer("heatmap"):
+        from habits.artifacts import artifact_key
+        from habits.heatmap import HEATMAP_VERSION, heatmap_table, render_heatmap
+        from habits.optimize import display_dpi, display_width
+        from habits.report import figure_png
+
+    heatmap_data = heatmap_table(df_daily_lw)
+
+    # Render at the size it's shown at, reusing the last render if the matrix is unchanged
+    pixels = display_width("heatmap")
+    key = artifact_key("heatmap", HEATMAP_VERSION, heatmap_data, {"width": pixels})
+    png = artifacts.get(key)
+    if png is not None:
+        print("Heatmap reused from cache!")
+        return png
+
+    # Colour all cells at once, draw them as a single image and render to memory
+    fig = render_heatmap(heatmap_data)
+    png = figure_png(fig, dpi=display_dpi(fig, pixels), bbox_inches="tight")
+    artifacts.put(key, png)
+    print(f"Heatmap rendered ({len(png) / 1024:.0f} kB)!")
+    return png
+
+
+@measured
+def html(tile_images, tile_areas=None):
+    """The report's HTML (see :func:`habits.report.report_html`)."""
+    with import_timer("report"):
+        from habits.report import report_html
+
+    return report_html(list(tile_images), tile_areas)
+
+
+@measured
+def images(wordclouds_png, heatmap_png, tile_images, tile_sheet_png=None):
+    """Every image by the file name used in the HTML, recompressed."""
+    with import_timer("report"):
+        from habits.optimize import format_sizes, optimize_images
+
+    # Collect all images by the file names used in the HTML and recompress them
+    if tile_sheet_png is not None:
+        tile_files = {"tiles.png": tile_sheet_png}
+    else:
+        tile_files = {f"{habit}.png": data for habit, data in tile_images.items()}
+    report_images, image_sizes = optimize_images(
+        {"wordclouds.png": wordclouds_png, "heatmap.png": heatmap_png, **tile_files}
+    )
+    print(f"Image sizes:\n{format_sizes(image_sizes)}")
+    return report_images
+
+
+@measured
+def keep(report_images, html_content, folder):
+    """Write the report to ``folder`` if ``HABITS_KEEP_ARTIFACTS`` asks for it."""
+    from habits.report import keep_artifacts, save_artifacts
+
+    # Only write the report to disk when debugging
+    if keep_artifacts():
+        if not folder:
+            raise ValueError("HABITS_KEEP_ARTIFACTS=1 needs OUTPUT_FOLDER to say where to write the report")
+        for filepath in save_artifacts(report_images, html_content, folder):
+            print(f"Saved to: {filepath}")
+
+
+@measured
+def message(html_content, report_images, email, subject="How was last week?"):
+    """The report's email to ``email``, with every image inlined from memory."""
+    from habits.report import build_message
+
+    return build_message(html_content, report_images, email, subject)
+
+
+@measured
+def send(message, email, password):
+    """Send the report's email over SMTP."""
+    from habits.report import send_message
+
+    send_message(message, email, password)
+    print("Email with dashboard sent successfully!")
+
+
+# The data behind the figures, which ``habits-report --watch`` keeps warm
+DATA_STAGES = [
+    Stage("load", load, ("path",), ("df_clean",)),
+    Stage("tables", tables, ("df_clean", "path", "now"), ("df_daily", "df_weekly")),
+    Stage("moods", moods, ("df_clean",), ("df_moods",)),
+    Stage("artifacts", artifact_cache, ("path",), ("artifacts",)),
+]
+
+# The figures only depend on the tables, not on each other
+FIGURE_STAGES = [
+    Stage("moods_lw", last_week, ("df_moods", "now"), ("df_moods_lw",)),
+    Stage("wordclouds", wordclouds, ("df_moods_lw", "artifacts"), ("wordclouds_png",)),
+    Stage("tiles", tiles, ("df_weekly", "artifacts"), ("tile_images", "tile_errors")),
+    Stage("sheet", sheet, ("tile_images",), ("tile_sheet_png", "tile_areas")),
+    Stage("daily_lw", last_week, ("df_daily", "now"), ("df_daily_lw",)),
+    Stage("heatmap", heatmap, ("df_daily_lw", "artifacts"), ("heatmap_png",)),
+]
+
+# The email built from the figures, and sent
+DELIVERY_STAGES = [
+    Stage("html", html, ("tile_images", "tile_areas"), ("html_content",)),
+    Stage(
+        "images",
+        images,
+        ("wordclouds_png", "heatmap_png", "tile_images", "tile_sheet_png"),
+        ("report_images",),
+    ),
+    Stage("keep", keep, ("report_images", "html_content", "output_folder")),
+    Stage("message", message, ("html_content", "report_images", "email"), ("message",)),
+    Stage("send", send, ("message", "email", "password")),
+]
+
+# Everything from ``path``, ``now``, ``output_folder``, ``email`` and ``password``
+REPORT_STAGES = [
+    Stage("check", check_fresh, ("path", "now"), ("file_stat",)),
+    Stage("load", load, ("path",), ("df_clean",), after=("check",)),
+    Stage("tables", tables, ("df_clean", "path", "now"), ("df_daily", "df_weekly")),
+    Stage("moods", moods, ("df_clean",), ("df_moods",)),
+    Stage("artifacts", artifact_cache, ("path",), ("artifacts",), after=("check",)),
+    *FIGURE_STAGES,
+    *DELIVERY_STAGES,
+]
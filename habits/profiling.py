@@ -0,0 +1,265 @@
+"""Opt-in profiles of every report stage.
+
+``HABITS_PROFILE`` picks a profiler, which then runs around every stage that
+is :func:`~habits.metrics.measured` (and the blocks ``app.py`` wraps in
+:func:`stage_profile`):
+
+- ``cprofile`` records every call with :mod:`cProfile` (``<stage>.prof``,
+  readable with :mod:`pstats` or snakeviz)
+- ``tracemalloc`` traces allocations only while each stage runs and keeps
+  where the memory it still held at the end came from
+  (``<stage>.tracemalloc``, a :class:`tracemalloc.Snapshot` dump)
+- ``sampling`` looks at the stage's stack every ``HABITS_PROFILE_INTERVAL``
+  seconds (default 0.005), like pyinstrument, and writes it in the folded
+  format flame graph tools read (``<stage>.folded``)
+
+:func:`write_profiles` saves them in a ``run-<time>`` folder per run under
+``HABITS_PROFILE_DIR`` (by default ``profiles`` in the cache directory),
+along with ``summary.txt``: the top ``HABITS_PROFILE_TOP`` (default 20)
+hotspots of all stages merged. The oldest runs are removed once they take
+more than ``HABITS_PROFILE_MAX_MB`` (default 64). Stages profiled with
+``cprofile`` or ``tracemalloc`` run one at a time so their profiles don't
+blend; tiles rendered in worker processes only show up as waiting on them.
+When ``HABITS_PROFILE`` is unset no profiler runs at all.
+
+:func:`take_profiles` hands out the profiles of stages run outside any
+:func:`profile_scope`; inside one (e.g. each dashboard session, or its
+background refresh) they're kept apart and handed out when it ends. Stages
+started by :func:`~habits.stages.run_stages` belong to the caller's scope.
+"""
+
+import contextvars
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from habits.cache import cache_dir_for, cache_enabled, evict
+
+PROFILE_MODES = ("cprofile", "tracemalloc", "sampling")
+DEFAULT_MAX_MB = 64
+RUN_PREFIX = "run-"
+
+_mode = None
+_profiles = defaultdict(list)  # Scope -> its profiles so far
+_scope = contextvars.ContextVar("habits_profile_scope", default=None)
+_lock = threading.Lock()
+# One cprofile/tracemalloc stage at a time, and none inside another
+_serial = threading.Lock()
+_active = threading.local()
+_off = nullcontext()
+
+
+def profile_mode():
+    """The profiler ``HABITS_PROFILE`` asks for, or ``None``."""
+    mode = os.getenv("HABITS_PROFILE", "").lower() or None
+    if mode not in (None, *PROFILE_MODES):
+        raise ValueError(f"HABITS_PROFILE must be one of {', '.join(PROFILE_MODES)}, not {mode!r}")
+    return mode
+
+
+def start_profiling():
+    """Turn on the profiler asked for, if any."""
+    global _mode
+    _mode = profile_mode()
+
+
+def active_profiler():
+    """The profiler this thread's current stage runs under, or ``None``."""
+    return _mode if getattr(_active, "stage", None) else None
+
+
+def stage_profile(stage):
+    """Context manager profiling ``stage`` (doing nothing while profiling is off)."""
+    if _mode is None or getattr(_active, "stage", None):
+        return _off
+    return _profiled(stage, _mode)
+
+
+@contextmanager
+def _profiled(stage, mode):
+    _active.stage = stage
+    # Stays None if the profiler never started, which has nothing to keep
+    data = None
+    try:
+        if mode == "sampling":
+            with _sampled() as data:
+                yield
+        else:
+            with _serial:
+                with _cprofiled() if mode == "cprofile" else _traced() as data:
+                    yield
+    finally:
+        _active.stage = None
+        if data is not None:
+            with _lock:
+                _profiles[_scope.get()].append((stage, mode, data))
+
+
+@contextmanager
+def _cprofiled():
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+
+
+@contextmanager
+def _traced():
+    import tracemalloc
+
+    # Snapshots of everything allocated since startup are slow, so trace just
+    # this stage, unless HABITS_TRACEMALLOC already traces the whole run
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    else:
+        before = tracemalloc.take_snapshot()
+    data = {}
+    try:
+        yield data
+    finally:
+        data["snapshot"] = tracemalloc.take_snapshot()
+        if started:
+            tracemalloc.stop()
+            data["stats"] = [(s.traceback, s.size, s.count) for s in data["snapshot"].statistics("lineno")]
+        else:
+            diff = data["snapshot"].compare_to(before, "lineno")
+            data["stats"] = [(s.traceback, s.size_diff, s.count_diff) for s in diff]
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+@contextmanager
+def _sampled():
+    interval = float(os.getenv("HABITS_PROFILE_INTERVAL", "0.005"))
+    thread_id = threading.get_ident()
+    stacks = Counter()
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stacks[tuple(reversed(stack))] += 1
+
+    sampler = threading.Thread(target=sample, name="habits-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield stacks
+    finally:
+        done.set()
+        sampler.join()
+
+
+def take_profiles():
+    """The ``(stage, mode, data)`` profiles so far, leaving none behind."""
+    with _lock:
+        return _profiles.pop(_scope.get(), [])
+
+
+@contextmanager
+def profile_scope():
+    """Keep the profiles of the block apart, yielding the list they end up in."""
+    profiles = []
+    token = _scope.set(object())
+    try:
+        yield profiles
+    finally:
+        profiles.extend(take_profiles())
+        _scope.reset(token)
+
+
+def profile_dir_for(path):
+    """Where to write profiles (``HABITS_PROFILE_DIR``, else ``profiles`` in the cache).
+
+    With ``HABITS_CACHE=0`` they go to the temporary directory instead.
+    """
+    if os.getenv("HABITS_PROFILE_DIR"):
+        return os.getenv("HABITS_PROFILE_DIR")
+    if not cache_enabled():
+        return os.path.join(tempfile.gettempdir(), "habits-profiles")
+    return os.path.join(cache_dir_for(path), "profiles")
+
+
+def _summary(profiles, top):
+    import io
+
+    mode = profiles[0][1]
+    out = io.StringIO()
+    print(f"Top {top} hotspots of {len(profiles)} stages ({mode})\n", file=out)
+
+    if mode == "cprofile":
+        import pstats
+
+        stats = pstats.Stats(*(data for _, _, data in profiles), stream=out)
+        stats.sort_stats("tottime").print_stats(top)
+
+    elif mode == "tracemalloc":
+        growth, blocks = defaultdict(int), defaultdict(int)
+        for _, _, data in profiles:
+            for traceback, size, count in data["stats"]:
+                where = str(traceback[0])
+                growth[where] += size
+                blocks[where] += count
+        print(f"{'KiB':>10} {'blocks':>8}  allocated at", file=out)
+        for where in sorted(growth, key=growth.get, reverse=True)[:top]:
+            print(f"{growth[where] / 1024:>10.1f} {blocks[where]:>8}  {where}", file=out)
+
+    else:
+        own, total = Counter(), Counter()
+        for _, _, stacks in profiles:
+            for stack, count in stacks.items():
+                own[stack[-1]] += count
+                for name in set(stack):
+                    total[name] += count
+        samples = sum(own.values()) or 1
+        print(f"{'own':>6} {'total':>6}  function (share of {samples} samples)", file=out)
+        for name, count in own.most_common(top):
+            print(f"{count / samples:>6.1%} {total[name] / samples:>6.1%}  {name}", file=out)
+
+    return out.getvalue()
+
+
+def write_profiles(profiles, directory, run_start):
+    """Save every stage's profile and the merged summary; returns the summary."""
+    run = datetime.fromtimestamp(run_start).strftime("%Y%m%d-%H%M%S")
+    folder = os.path.join(directory, f"{RUN_PREFIX}{run}")
+    os.makedirs(folder, exist_ok=True)
+
+    seen = Counter()
+    for stage, mode, data in profiles:
+        # Stages that run more than once (e.g. last_week) get numbered
+        seen[stage] += 1
+        name = stage if seen[stage] == 1 else f"{stage}-{seen[stage]}"
+        path = os.path.join(folder, name)
+        if mode == "cprofile":
+            data.dump_stats(f"{path}.prof")
+        elif mode == "tracemalloc":
+            data["snapshot"].dump(f"{path}.tracemalloc")
+        else:
+            with open(f"{path}.folded", "w") as f:
+                for stack, count in data.items():
+                    f.write(f"{';'.join(stack)} {count}\n")
+
+    summary = _summary(profiles, int(os.getenv("HABITS_PROFILE_TOP", "20")))
+    with open(os.path.join(folder, "summary.txt"), "w") as f:
+        f.write(summary)
+    print(f"Profiles saved to: {folder}")
+
+    # Every run's folder is an entry, dropped oldest first
+    max_bytes = float(os.getenv("HABITS_PROFILE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+    evict(directory, max_bytes, keep=(os.path.basename(folder),), suffix=None, dir_prefix=RUN_PREFIX)
+    return summary
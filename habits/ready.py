@@ -0,0 +1,204 @@
+"""Waiting for the export to finish syncing before it gets read.
+
+The export lands via iCloud, so right after a run starts it may still be a
+placeholder or half downloaded. Instead of reading the whole file and sleeping
+for a fixed time, :func:`wait_until_ready` reads a single byte to prompt the
+download and then returns as soon as the file's size and mtime have stopped
+changing for ``settle`` seconds.
+
+Changes are picked up with inotify on Linux and kqueue on macOS, so waiting
+wakes up on the next write rather than on the next poll. Anywhere else the
+file is simply polled. :func:`wait_for_change` uses the same watchers to
+sleep until the export changes at all.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_SETTLE = 0.25
+POLL_INTERVAL = 0.05
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_EVENT = struct.Struct("iIII")
+
+
+class _InotifyWatcher:
+    def __init__(self, path):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.name = os.fsencode(os.path.basename(path))
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # Watch the folder, as syncing may replace the file instead of writing to it
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        folder = os.fsencode(os.path.dirname(os.path.abspath(path)))
+        if self.libc.inotify_add_watch(self.fd, folder, mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        data = os.read(self.fd, 64 * 1024)
+        offset, changed = 0, False
+        while offset < len(data):
+            _, _, _, length = IN_EVENT.unpack_from(data, offset)
+            name = data[offset + IN_EVENT.size : offset + IN_EVENT.size + length]
+            changed |= name.rstrip(b"\0") == self.name
+            offset += IN_EVENT.size + length
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _KqueueWatcher:
+    def __init__(self, path):
+        self.path = path
+        self.kq = select.kqueue()
+        self.fd = None
+        self._open()
+
+    def _open(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            # Don't close it again if the file is gone and reopening fails
+            self.fd = None
+        self.fd = os.open(self.path, os.O_RDONLY)
+        flags = (
+            select.KQ_NOTE_WRITE
+            | select.KQ_NOTE_EXTEND
+            | select.KQ_NOTE_ATTRIB
+            | select.KQ_NOTE_DELETE
+            | select.KQ_NOTE_RENAME
+        )
+        event = select.kevent(
+            self.fd,
+            filter=select.KQ_FILTER_VNODE,
+            flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+            fflags=flags,
+        )
+        self.kq.control([event], 0, 0)
+
+    def wait(self, timeout):
+        events = self.kq.control(None, 8, timeout)
+        if any(e.fflags & (select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME) for e in events):
+            # The file got replaced, so follow the new one
+            try:
+                self._open()
+            except FileNotFoundError:
+                pass
+        return bool(events)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.kq.close()
+
+
+class _PollWatcher:
+    def wait(self, timeout):
+        time.sleep(min(timeout, POLL_INTERVAL))
+        return False
+
+    def close(self):
+        pass
+
+
+def _watcher_for(path):
+    # Prefer events, fall back to polling if they aren't available
+    try:
+        if hasattr(select, "kqueue"):
+            return _KqueueWatcher(path)
+        if os.uname().sysname == "Linux":
+            return _InotifyWatcher(path)
+    except (OSError, AttributeError):
+        pass
+    return _PollWatcher()
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _prompt_sync(path):
+    # Reading a single byte is enough to make iCloud download an evicted file
+    try:
+        with open(path, "rb") as f:
+            f.read(1)
+    except FileNotFoundError:
+        pass
+
+
+def wait_until_ready(path, timeout=None, settle=None):
+    """Block until ``path`` exists and its size and mtime have settled.
+
+    Returns the file's final ``os.stat_result`` or raises ``TimeoutError``
+    after ``timeout`` seconds (``HABITS_READY_TIMEOUT``, default 60).
+    """
+    if timeout is None:
+        timeout = float(os.getenv("HABITS_READY_TIMEOUT", DEFAULT_TIMEOUT))
+    if settle is None:
+        settle = float(os.getenv("HABITS_READY_SETTLE", DEFAULT_SETTLE))
+
+    _prompt_sync(path)
+    deadline = time.monotonic() + timeout
+    last = _signature(path)
+    stable_since = time.monotonic()
+    watcher = _watcher_for(path) if last is not None else _PollWatcher()
+
+    try:
+        while True:
+            now = time.monotonic()
+            if last is not None and now - stable_since >= settle:
+                return os.stat(path)
+            if now >= deadline:
+                raise TimeoutError(f"{path} did not settle within {timeout:g}s")
+
+            # Wait for a change, but no longer than needed to call it settled
+            wait_for = settle - (now - stable_since) if last is not None else POLL_INTERVAL
+            changed = watcher.wait(max(0.0, min(wait_for, deadline - now)))
+            current = _signature(path)
+            if changed or current != last:
+                if last is None and current is not None:
+                    _prompt_sync(path)
+                    watcher.close()
+                    watcher = _watcher_for(path)
+                last, stable_since = current, time.monotonic()
+    finally:
+        watcher.close()
+
+
+def wait_for_change(path, timeout):
+    """Block until ``path``'s size or mtime differ from now, for up to ``timeout`` seconds.
+
+    Returns whether it changed (appearing or disappearing counts too).
+    """
+    last = _signature(path)
+    deadline = time.monotonic() + timeout
+    watcher = _watcher_for(path) if last is not None else _PollWatcher()
+    try:
+        while _signature(path) == last:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            watcher.wait(remaining)
+        return True
+    finally:
+        watcher.close()
@@ -0,0 +1,185 @@
+"""Assembling the weekly report email in memory.
+
+Every image is kept as PNG bytes from the moment it's rendered until it's
+attached to the email, so a normal run never touches ``OUTPUT_FOLDER``. Set
+``HABITS_KEEP_ARTIFACTS=1`` to also write the images and ``dashboard.html``
+there for debugging; they are left in place afterwards.
+
+The one copy on disk is the artifact cache (:mod:`habits.artifacts`), which
+keeps newly rendered images to reuse next time; ``HABITS_ARTIFACT_MAX_MB=0``
+turns it off for a run that neither writes nor reads any image.
+"""
+
+import html
+import io
+import os
+import re
+import smtplib
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from habits.env import env_flag
+from habits.sheet import sheet_html
+
+
+def keep_artifacts():
+    """Whether to write the report's files to disk (``HABITS_KEEP_ARTIFACTS``)."""
+    return env_flag("HABITS_KEEP_ARTIFACTS")
+
+
+def figure_png(fig, **kwargs):
+    """Render a matplotlib figure straight to PNG bytes."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", **kwargs)
+    return buffer.getvalue()
+
+
+def save_artifacts(images, html_content, folder):
+    """Write the images and the HTML to ``folder``; returns the paths written."""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for filename, data in {**images, "dashboard.html": html_content.encode()}.items():
+        paths.append(os.path.join(folder, filename))
+        with open(paths[-1], "wb") as f:
+            f.write(data)
+    return paths
+
+
+def report_html(habits, tile_areas=None):
+    """The report's HTML, referring to images by file name.
+
+    Tiles are shown one ``<img>`` per habit, or as a single contact sheet
+    when its ``tile_areas`` are given.
+    """
+    # Base HTML content
+    html_content = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+      <style>
+        .grid-container {
+          display: grid;
+          grid-template-columns: repeat(4, 1fr); /* 4 columns */
+          gap: 10px;
+        }
+        .grid-item img {
+          width: 100%;
+          border: 1px solid #ddd;
+          border-radius: 4px;
+          padding: 5px;
+        }
+        .grid-item {
+          text-align: center;
+          font-family: "Helvetica", sans-serif;
+          font-size: 14px;
+        }
+        h1 {
+          text-align: center;
+          font-family: "Helvetica", sans-serif;
+          font-size: 24px;
+        }
+        h2 {
+          text-align: center;
+          font-family: "Helvetica", sans-serif;
+          font-size: 20px;
+        }
+      </style>
+    </head>
+    <body>
+    """
+
+    # Add wordclouds section
+    html_content += """
+      <h2>Mood Wordclouds</h2>
+      <div style="text-align: center;">
+        <img src="wordclouds.png" alt="Wordclouds" style="max-width: 800px; padding: 5px;">
+      </div>
+      <br>
+    """
+
+    # Add tiles section, either as one contact sheet or a table of tiles
+    if tile_areas:
+        html_content += f"""
+      <h2>Habit Tiles</h2>
+      <div style="text-align: center;">
+        {sheet_html(tile_areas)}
+      </div>
+      <br>
+    """
+    else:
+        html_content += """
+      <h2>Habit Tiles</h2>
+      <table style="width: auto; max-width: 800px; margin: auto; border-collapse: collapse; text-align: center;">
+        <tr>
+    """
+
+        # Add each habit's tile to the HTML
+        for index, habit in enumerate(habits):
+            label = html.escape(habit)
+            html_content += f"""
+          <td>
+            <img src="{label}.png" alt="{label}" style="max-width: 200px; border: 1px solid #ddd; border-radius: 1px;">
+          </td>
+        """
+            # Close the row every 4 items
+            if (index + 1) % 4 == 0:
+                html_content += "</tr><tr>"
+
+        # Close the last row and table
+        html_content += """
+        </tr>
+      </table>
+      <br>
+    """
+
+    # Add heatmap section
+    html_content += """
+      <h2>Habit Heatmap</h2>
+      <div style="text-align: center;">
+        <img src="heatmap.png" alt="Heatmap" style="max-width: 800px; padding: 5px;">
+      </div>
+    """
+
+    # Close the HTML
+    html_content += """
+    </body>
+    </html>
+    """
+    return html_content
+
+
+def build_message(html_content, images, sender, subject):
+    """Email with the HTML and every image inlined by ``cid``.
+
+    ``images`` maps the file names used in ``src`` attributes of the HTML to
+    PNG bytes.
+    """
+    # Create the email
+    message = MIMEMultipart("alternative")
+    message["From"] = sender
+    message["To"] = sender
+    message["Subject"] = subject
+
+    # Point the HTML at the "cid" of each image in a single pass (names are escaped in it)
+    cids = {filename: f"cid:image{idx + 1}" for idx, filename in enumerate(images)}
+    html_content_cid = re.sub(
+        r'src="([^"]+)"', lambda m: f'src="{cids.get(html.unescape(m[1]), m[1])}"', html_content
+    )
+    message.attach(MIMEText(html_content_cid, "html"))
+
+    # Attach images used in the HTML
+    for idx, data in enumerate(images.values()):
+        img_part = MIMEImage(data)
+        img_part.add_header("Content-ID", f"<image{idx + 1}>")  # Match the "cid" in HTML
+        img_part.add_header("Content-Disposition", "inline")  # Explicitly set as inline
+        message.attach(img_part)
+    return message
+
+
+def send_message(message, email, password, host="smtp.gmail.com", port=587):
+    """Send ``message`` from ``email`` to itself over STARTTLS."""
+    with smtplib.SMTP(host, port) as server:
+        server.starttls()
+        server.login(email, password)
+        server.sendmail(email, email, message.as_string())
@@ -0,0 +1,124 @@
+"""One copy of the dashboard's data per process, shared and kept fresh.
+
+``marimo run app.py`` runs each viewer's cells separately but in the same
+process, so every viewer used to load the export, refresh the daily table and
+compute the moving averages again, each keeping their own copy.
+:func:`dashboard_data` builds that once per version of the export (its path,
+size and mtime, and the week, as the tables only hold complete weeks) and
+hands every session the same :class:`DashboardData`.
+
+Only the very first call for an export waits for it to be built. From then on
+a background thread watches the export and, once a new version has finished
+syncing, builds its data and swaps it in, while every call keeps getting the
+last good snapshot straight from memory (stale-while-revalidate). Sessions
+still showing an older snapshot keep it alive until they move on.
+"""
+
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from habits.profiling import profile_dir_for, profile_scope, stage_profile, write_profiles
+
+# How often the refresher checks on the export without being woken by a change
+# (and notices a new week starting)
+CHECK_INTERVAL = 60.0
+
+_latest = {}  # Export path -> (key, DashboardData)
+_building = {}  # Export path -> lock held while it's built
+_refreshers = {}  # Export path -> refresher thread
+_lock = threading.Lock()
+
+
+class DashboardData:
+    """The daily table and everything computed from it, read-only.
+
+    ``daily`` is a single Arrow table; ``df_daily`` is a polars frame over the
+    same buffers, and ``moving_avgs`` the :class:`~habits.windows.MovingAverages`
+    of it. ``modified`` is when the export it came from was last modified.
+    """
+
+    def __init__(self, daily, modified):
+        import polars as pl
+
+        from habits.windows import MovingAverages
+
+        self.daily = daily
+        self.modified = modified
+        self.df_daily = pl.from_arrow(daily)
+        with stage_profile("moving_averages"):
+            self.moving_avgs = MovingAverages(self.df_daily)
+        self.moving_avgs.matrix.setflags(write=False)
+        self.habits = sorted(self.df_daily["name"].unique(), reverse=True)
+
+
+def _key(path, now):
+    stat = os.stat(path)
+    week = (now - timedelta(days=now.weekday())).date()
+    return path, stat.st_size, stat.st_mtime_ns, week
+
+
+def _build(path, key, now):
+    from habits import load_clean
+    from habits.warehouse import db_path_for, materialize
+
+    # Only the daily table is kept, the cleaned export goes once it's in DuckDB
+    with stage_profile("load"):
+        df_clean = load_clean(path)
+    with stage_profile("tables"):
+        df_daily, _ = materialize(df_clean, db_path_for(path), now)
+    data = DashboardData(df_daily.to_arrow(), datetime.fromtimestamp(key[2] / 1e9))
+    _latest[path] = (key, data)
+    return data
+
+
+def _refresh(path):
+    from habits.ready import wait_for_change, wait_until_ready
+
+    while True:
+        try:
+            if wait_for_change(path, CHECK_INTERVAL):
+                wait_until_ready(path)
+            now = datetime.now()
+            key = _key(path, now)
+            if key != _latest[path][0]:
+                # Profiled on its own, not as part of whichever session takes profiles next
+                with profile_scope() as profiles, _building[path]:
+                    _build(path, key, now)
+                print(f"Dashboard data refreshed from the export of {_latest[path][1].modified}")
+                if profiles:
+                    write_profiles(profiles, profile_dir_for(path), now.timestamp())
+        except Exception:
+            # Keep serving the last good snapshot and try again later
+            traceback.print_exc()
+            time.sleep(CHECK_INTERVAL)
+
+
+def dashboard_data(path):
+    """The latest :class:`DashboardData` of the export at ``path``.
+
+    Only blocks while the first one is built; after that it never touches the
+    export, which a background thread refreshes instead.
+    """
+    path = os.path.abspath(path)
+    latest = _latest.get(path)
+    if latest is not None:
+        return latest[1]
+
+    with _lock:
+        lock = _building.setdefault(path, threading.Lock())
+
+    # One session builds it, any others arriving meanwhile wait and reuse it
+    with lock:
+        if path not in _latest:
+            now = datetime.now()
+            _build(path, _key(path, now), now)
+    with _lock:
+        if path not in _refreshers:
+            _refreshers[path] = threading.Thread(
+                target=_refresh, args=(path,), name="habits-refresher", daemon=True
+            )
+            _refreshers[path].start()
+    return _latest[path][1]
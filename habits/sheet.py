@@ -0,0 +1,83 @@
+"""Habit tiles composited into a single contact sheet.
+
+Attaching every tile on its own makes the email grow by one MIME part (and
+one fetch in the mail client) per habit. With ``HABITS_TILE_SHEET=1`` the
+tiles are pasted into one grid image instead, and :func:`sheet_html` lays it
+out with an image map so each habit keeps its own ``alt`` text and tooltip.
+"""
+
+import html
+import io
+
+import numpy as np
+from PIL import Image
+
+from habits.env import env_flag
+from habits.optimize import DISPLAY_WIDTHS
+
+# Grid of the report's tile section, in CSS pixels
+COLUMNS = 4
+GAP = 4
+BORDER = (0xDD, 0xDD, 0xDD, 0xFF)
+
+
+def sheet_enabled():
+    """Whether to send the tiles as one contact sheet (``HABITS_TILE_SHEET``)."""
+    return env_flag("HABITS_TILE_SHEET")
+
+
+def contact_sheet(images, display_width=DISPLAY_WIDTHS["tile"], columns=COLUMNS, gap=GAP):
+    """Paste PNG tiles into one grid image, ``columns`` wide.
+
+    ``images`` maps names to PNG bytes and ``display_width`` is the width (in
+    CSS pixels) each tile is shown at; tiles rendered for HiDPI screens keep
+    their extra pixels. Returns ``(png, areas)``, where ``areas`` maps every
+    name to its ``(left, top, right, bottom)`` in CSS pixels.
+    """
+    tiles = {name: Image.open(io.BytesIO(data)).convert("RGBA") for name, data in images.items()}
+    width, height = next(iter(tiles.values())).size
+    density = width / display_width
+    gap = round(gap * density)
+    columns = min(columns, len(tiles))
+    rows = -(-len(tiles) // columns)
+
+    # Start from a white canvas and paste every tile into its cell
+    shape = (rows * (height + gap) - gap, columns * (width + gap) - gap, 4)
+    canvas = np.full(shape, 255, np.uint8)
+    areas = {}
+    for i, (name, tile) in enumerate(tiles.items()):
+        if tile.size != (width, height):
+            tile = tile.resize((width, height), Image.Resampling.LANCZOS)
+        x, y = i % columns * (width + gap), i // columns * (height + gap)
+        pixels = np.asarray(tile)
+        alpha = pixels[..., 3:] / 255
+        cell = canvas[y : y + height, x : x + width]
+        cell[..., :3] = (pixels[..., :3] * alpha + cell[..., :3] * (1 - alpha)).round()
+
+        # Outline the tile like the report's per-tile images
+        border = max(1, round(density))
+        for edge in (cell[:border], cell[-border:], cell[:, :border], cell[:, -border:]):
+            edge[:] = BORDER
+        areas[name] = tuple(round(v / density) for v in (x, y, x + width, y + height))
+
+    buffer = io.BytesIO()
+    Image.fromarray(canvas).save(buffer, format="PNG")
+    return buffer.getvalue(), areas
+
+
+def sheet_html(areas, src="tiles.png", name="tiles"):
+    """``<img>`` of a contact sheet plus an image map naming each tile."""
+    width = max(right for _, _, right, _ in areas.values())
+    height = max(bottom for _, _, _, bottom in areas.values())
+    lines = [
+        f'<img src="{src}" usemap="#{name}" alt="Habit tiles" width="{width}" height="{height}" '
+        f'style="max-width: 100%; height: auto;">',
+        f'<map name="{name}">',
+    ]
+    for habit, coords in areas.items():
+        label = html.escape(habit)
+        lines.append(
+            f'  <area shape="rect" coords="{",".join(map(str, coords))}" alt="{label}" title="{label}">'
+        )
+    lines.append("</map>")
+    return "\n".join(lines)
@@ -0,0 +1,120 @@
+"""Running the report's stages as a dependency graph.
+
+Once the daily, weekly and mood tables exist, the word clouds, tiles and
+heatmap don't depend on each other, yet run one after another they take as
+long as all three together. Each :class:`Stage` names the values it takes
+and the ones it produces, and :func:`run_stages` starts every stage as soon
+as its inputs exist, running independent ones side by side on a pool of
+``HABITS_STAGE_WORKERS`` threads (default 4). The slow parts release the GIL
+(Kaleido and the tile processes, Agg and Pillow), so threads are enough.
+"""
+
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_WORKERS = 4
+
+
+class Stage:
+    """``func`` called with the values named by ``inputs``, in that order.
+
+    Its result is stored under ``outputs``: as is for a single output,
+    unpacked for several, ignored for none. ``after`` names stages that must
+    have finished first without passing anything on.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), after=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.after = tuple(after)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, {', '.join(self.inputs)} -> {', '.join(self.outputs)})"
+
+    def run(self, values):
+        result = self.func(*(values[name] for name in self.inputs))
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        return dict(zip(self.outputs, result or ()))
+
+
+class StageFailed(Exception):
+    """A stage raised; the original exception is its ``__cause__``."""
+
+    def __init__(self, stage):
+        super().__init__(f"Stage {stage!r} failed")
+        self.stage = stage
+
+
+def stage_workers():
+    """Number of stages run at once (``HABITS_STAGE_WORKERS``, default 4)."""
+    return int(os.getenv("HABITS_STAGE_WORKERS", 0)) or DEFAULT_WORKERS
+
+
+def _check(stages, values):
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate stage names in {names}")
+    produced = set(values).union(*(stage.outputs for stage in stages))
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in produced]
+        missing += [name for name in stage.after if name not in names]
+        if missing:
+            raise ValueError(f"Nothing provides {', '.join(missing)} for stage {stage.name!r}")
+
+
+def print_timing(stage, seconds):
+    """``on_done`` for :func:`run_stages` printing how long each stage took."""
+    print(f"[{stage.name}] {seconds * 1000:.0f} ms")
+
+
+def _timed(stage, values):
+    start = time.perf_counter()
+    outputs = stage.run(values)
+    return outputs, time.perf_counter() - start
+
+
+def run_stages(stages, values=None, workers=None, on_done=None):
+    """Run ``stages`` in dependency order, independent ones concurrently.
+
+    ``values`` are the inputs nothing produces, and ``on_done(stage,
+    seconds)`` is called as each stage finishes. Returns every value, given
+    and produced. If a stage fails, the ones already running are finished,
+    no new ones start and :class:`StageFailed` is raised from its error.
+    """
+    values = dict(values or {})
+    _check(stages, values)
+    pending, running, done = list(stages), {}, set()
+
+    with ThreadPoolExecutor(max_workers=workers or stage_workers()) as pool:
+        failed = None
+        while (pending and failed is None) or running:
+            # Start everything whose inputs and predecessors are all there
+            for stage in [s for s in pending if failed is None]:
+                if all(name in values for name in stage.inputs) and done.issuperset(stage.after):
+                    pending.remove(stage)
+                    # In the caller's context, so its profile scope carries over
+                    running[pool.submit(contextvars.copy_context().run, _timed, stage, values)] = stage
+            if not running:
+                raise ValueError(f"Stages {[s.name for s in pending]} depend on each other")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    outputs, seconds = future.result()
+                except Exception as e:
+                    failed = failed or (stage, e)
+                    continue
+                values.update(outputs)
+                done.add(stage.name)
+                if on_done:
+                    on_done(stage, seconds)
+
+    if failed is not None:
+        raise StageFailed(failed[0].name) from failed[1]
+    return values
@@ -0,0 +1,222 @@
+"""Habit tiles for the weekly report, rendered across a process pool.
+
+Exporting each tile with Kaleido is by far the slowest part of the report, and
+the tiles don't depend on each other. :func:`render_tiles` hands them out to a
+pool of ``HABITS_TILE_WORKERS`` processes (default: one per core), each of
+which exports its share through a single warm Kaleido session. Tiles come
+back as PNG bytes keyed by habit regardless of which worker rendered them,
+and a failing tile is reported without taking the others down.
+"""
+
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from habits.artifacts import artifact_key
+from habits.export import export_images
+from habits.partition import PartitionIndex
+
+# Bump whenever build_tile draws something different
+TILE_VERSION = 1
+
+# Side of the square layout tiles are drawn at, before scaling on export
+TILE_SIZE = 500
+
+# Weeks of trend shown on each tile
+TILE_WEEKS = 8
+
+# Create a configuration dictionary and assign
+TILE_OPTS = {
+    "Track": {"format": ".1f", "delta_relative": True, "y_range": None},
+    "Default": {
+        "format": ".0%",
+        "delta_relative": False,
+        "y_range": [-0.1, 1.1],
+    },
+}
+
+
+def tile_series(df_weekly, weeks=TILE_WEEKS):
+    """``(habit, trend, time)`` of the last ``weeks`` weeks of every habit, Z to A."""
+    # Index the weekly data by habit once, so each tile just slices it
+    weekly_index = PartitionIndex(df_weekly, key="name", order="week")
+    tiles = []
+    for habit in sorted(weekly_index.keys, reverse=True):
+        df_filtered = weekly_index.tail(habit, weeks)
+        tiles.append((habit, df_filtered["quantity_avg"].to_list(), df_filtered["week"].to_list()))
+    return tiles
+
+
+def build_tile(habit, trend, time):
+    """Big number with week-on-week delta above the trailing weekly trend."""
+    # Create a 2x1 grid with different subplot types
+    fig = make_subplots(
+        rows=2,
+        cols=1,
+        specs=[[{"type": "indicator"}], [{"type": "xy"}]],
+        row_heights=[0.5, 0.5],
+        vertical_spacing=0.1,
+    )
+    configs = TILE_OPTS.get(habit.split()[0], TILE_OPTS["Default"])
+    inverted = habit.startswith("No") or habit.endswith("screen")
+
+    # Add the big number with delta in the top cell
+    fig.add_trace(
+        go.Indicator(
+            mode="number+delta",
+            value=trend[-1],
+            number={"valueformat": configs["format"]},
+            delta={
+                "reference": trend[-2],
+                "relative": configs["delta_relative"],
+                "valueformat": ".0%",
+                "increasing": {"color": "red"} if inverted else None,
+                "decreasing": {"color": "green"} if inverted else None,
+            },
+        ),
+        row=1,
+        col=1,
+    )
+
+    # Add the average line in the bottom cell first
+    avg_value = sum(trend) / len(trend)
+    fig.add_trace(
+        go.Scatter(
+            x=time,
+            y=[avg_value] * len(time),  # Repeat avg for each x
+            mode="lines",
+            name="Average",
+            line=dict(color="red", dash="dash"),
+        ),
+        row=2,
+        col=1,
+    )
+
+    # Add the line chart in the bottom cell
+    fig.add_trace(
+        go.Scatter(
+            x=time,
+            y=trend,
+            mode="lines+markers",
+            name="Trendline",
+            line=dict(color="blue"),
+            marker=dict(size=8),
+        ),
+        row=2,
+        col=1,
+    )
+
+    # Update layout
+    fig.update_layout(
+        title={
+            "text": f"<u>{habit}</u>",
+            "x": 0.5,
+            "xanchor": "center",
+            "yanchor": "top",
+            "font": {"size": 40},
+        },
+        height=TILE_SIZE,
+        width=TILE_SIZE,
+        showlegend=False,
+        plot_bgcolor="rgba(0,0,0,0)",
+        xaxis=dict(
+            showgrid=True,
+            gridcolor="rgba(200,200,200,0.5)",
+            tickformat="%m-%d",
+            tickmode="array",
+            tickvals=[date for date in time if date.weekday() == 0],
+        ),
+        yaxis=dict(
+            zeroline=True,
+            zerolinecolor="rgba(200,200,200,0.5)",
+            showgrid=True,
+            automargin=True,
+            gridcolor="rgba(200,200,200,0.5)",
+            range=configs["y_range"],
+            tickformat=configs["format"],
+        ),
+    )
+    return fig
+
+
+def _render_batch(jobs, scale=1):
+    # Runs in a worker with one warm Kaleido session, reporting failures instead of raising
+    figs, errors = [], []
+    for habit, trend, time in jobs:
+        try:
+            figs.append(build_tile(habit, trend, time))
+            errors.append(None)
+        except Exception as e:
+            figs.append(None)
+            errors.append(f"{type(e).__name__}: {' '.join(str(e).split())}")
+
+    built = [i for i, fig in enumerate(figs) if fig is not None]
+    buffers = {i: io.BytesIO() for i in built}
+    exported = export_images([figs[i] for i in built], [buffers[i] for i in built], scale=scale)
+    for i, error in zip(built, exported):
+        errors[i] = error
+    return [
+        (buffers[i].getvalue() if error is None else None, error)
+        for i, error in enumerate(errors)
+    ]
+
+
+def _mp_context():
+    # Forking a process that's running other threads (see habits.stages) can deadlock
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def tile_workers():
+    """Number of worker processes (``HABITS_TILE_WORKERS``, default one per core)."""
+    return int(os.getenv("HABITS_TILE_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def render_tiles(tiles, workers=None, cache=None, scale=1):
+    """Render ``(habit, trend, time)`` tiles to PNG bytes.
+
+    Each tile is exported at ``scale`` times :data:`TILE_SIZE` pixels wide.
+    Tiles found in ``cache`` (an :class:`~habits.artifacts.ArtifactCache`) are
+    taken from there instead of rendered. Returns ``(images, errors)``, both
+    dicts keyed by habit, in input order.
+    """
+    # Reuse tiles whose weeks haven't changed
+    keys = [artifact_key("tile", TILE_VERSION, scale, habit, trend, time) for habit, trend, time in tiles]
+    outcomes = [(cache.get(key) if cache else None, None) for key in keys]
+    pending = [i for i, (data, _) in enumerate(outcomes) if data is None]
+    workers = min(workers or tile_workers(), len(pending)) or 1
+
+    # Render in-process when there's nothing to gain from a pool
+    if not pending:
+        pass  # All cached, no need to start a browser
+    elif workers == 1:
+        for i, outcome in zip(pending, _render_batch([tiles[i] for i in pending], scale)):
+            outcomes[i] = outcome
+    else:
+        # Deal the tiles out round-robin, one batch (and Kaleido session) per worker
+        batches = [pending[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) as pool:
+            futures = [
+                pool.submit(_render_batch, [tiles[i] for i in batch], scale) for batch in batches
+            ]
+            for batch, future in zip(batches, futures):
+                try:
+                    results = future.result()
+                except Exception as e:  # e.g. the worker process died
+                    results = [(None, f"{type(e).__name__}: {e}")] * len(batch)
+                for i, outcome in zip(batch, results):
+                    outcomes[i] = outcome
+
+    images, errors, rendered = {}, {}, set(pending)
+    for i, ((habit, _, _), (data, error)) in enumerate(zip(tiles, outcomes)):
+        if error is None:
+            images[habit] = data
+            if cache and i in rendered:
+                cache.put(keys[i], data)
+        else:
+            errors[habit] = error
+    return images, errors
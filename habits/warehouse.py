@@ -0,0 +1,154 @@
+"""On-disk DuckDB database with materialized ``daily`` and ``weekly`` tables.
+
+Both notebooks used to re-run the daily CASE/filter and the weekly GROUP BY
+over the whole history on every run. :func:`materialize` keeps the results in
+``habits.duckdb`` in the cache directory (or ``HABITS_DB``) and on each refresh
+only rewrites the rows dated on or after the last refreshed day, plus the weeks
+they fall into.
+
+The older rows are trusted as long as their count and a hash checksum still
+match what was recorded at the previous refresh; if anything before the last
+refreshed day changed, both tables are rebuilt from scratch. Set
+``HABITS_DB=:memory:`` (or ``HABITS_CACHE=0``) to skip persistence altogether.
+"""
+
+import os
+from datetime import datetime
+
+import duckdb
+
+from habits.cache import cache_dir_for, cache_enabled
+
+DB_VERSION = 1
+
+SCHEMA = """
+create table if not exists daily (
+    date date,
+    day varchar,
+    name varchar,
+    quantity float
+);
+create table if not exists weekly (
+    week date,
+    name varchar,
+    quantity_avg double
+);
+create table if not exists refresh_state (
+    version integer,
+    last_date date,
+    rows bigint,
+    checksum hugeint
+);
+"""
+
+# Same as the daily view the notebooks used to compute inline
+DAILY_SQL = """
+select
+    Date as date,
+    strftime(Date, '%a') as day,
+    Name::varchar as name,
+    case
+        when Name in ('Track sleep', 'Track screen')
+        then Quantity::float / 60
+
+        when Name = 'Track steps'
+        then Quantity::float / 1000
+
+        else Quantity::float
+    end as quantity
+from df_clean
+where
+    Name not in ('Mark habits', 'Export habits')
+    and Status != 'Skipped'
+    and Date >= ?
+"""
+
+WEEKLY_SQL = """
+select
+    date_trunc('week', date) as week,
+    name,
+    round(avg(quantity), 2) as quantity_avg
+from daily
+where date >= date_trunc('week', ?::date)
+group by 1, 2
+"""
+
+# Fingerprint of the rows older than a given day
+CHECKSUM_SQL = """
+select count(*), coalesce(sum(hash(Date, Name::varchar, Status::varchar, Quantity)), 0)
+from df_clean
+where Date < ?
+"""
+
+
+def db_path_for(path):
+    """Location of the DuckDB file for a given export (in memory if ``HABITS_CACHE=0``)."""
+    if os.getenv("HABITS_DB"):
+        return os.getenv("HABITS_DB")
+    return os.path.join(cache_dir_for(path), "habits.duckdb") if cache_enabled() else ":memory:"
+
+
+def _connect(db_path):
+    if db_path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    try:
+        return duckdb.connect(db_path)
+    except duckdb.IOException:
+        # Locked by another process, so just compute everything in memory
+        return duckdb.connect()
+
+
+def refresh(con, df_clean):
+    """Bring ``daily`` and ``weekly`` up to date with ``df_clean``."""
+    con.execute(SCHEMA)
+    con.register("df_clean", df_clean)
+    state = con.execute(
+        "select last_date, rows, checksum from refresh_state where version = ?", [DB_VERSION]
+    ).fetchone()
+
+    # Only redo the last refreshed day onwards if nothing older changed
+    since = None
+    if state is not None and state[0] is not None:
+        rows, checksum = con.execute(CHECKSUM_SQL, [state[0]]).fetchone()
+        if (rows, checksum) == (state[1], state[2]):
+            since = state[0]
+
+    con.begin()
+    if since is None:
+        con.execute("delete from daily")
+        con.execute("delete from weekly")
+        since = con.execute("select min(Date) from df_clean").fetchone()[0]
+    if since is not None:
+        con.execute("delete from daily where date >= ?", [since])
+        con.execute(f"insert into daily {DAILY_SQL}", [since])
+        con.execute("delete from weekly where week >= date_trunc('week', ?::date)", [since])
+        con.execute(f"insert into weekly {WEEKLY_SQL}", [since])
+
+    # Remember where this refresh got to, keeping the checksum in SQL: bound
+    # as a parameter, a hugeint this large would lose precision
+    last_date = con.execute("select max(Date) from df_clean").fetchone()[0]
+    con.execute("delete from refresh_state")
+    con.execute(
+        f"insert into refresh_state select ?, ?, * from ({CHECKSUM_SQL})",
+        [DB_VERSION, last_date, last_date],
+    )
+    con.commit()
+    con.unregister("df_clean")
+
+
+def materialize(df_clean, db_path, now=None):
+    """Refresh the tables and return ``(df_daily, df_weekly)`` as polars frames.
+
+    Like before, both only cover complete weeks: those before ``now``'s
+    (default today).
+    """
+    today = (now or datetime.now()).date()
+    with _connect(db_path) as con:
+        refresh(con, df_clean)
+        df_daily = con.execute(
+            "select * from daily where date < date_trunc('week', ?::date) order by date, name", [today]
+        ).pl()
+        df_weekly = con.execute(
+            "select * from weekly where week < date_trunc('week', ?::date) order by 1, 2", [today]
+        ).pl()
+    return df_daily, df_weekly
@@ -0,0 +1,69 @@
+"""Moving averages for every habit and window, computed once per data load.
+
+The dashboard used to run a window query over the whole daily table each time
+a dropdown changed. :class:`MovingAverages` instead sorts the daily rows by
+habit and date, takes a single cumulative sum over all of them and derives the
+trailing average for every offered window from it. Picking a habit and window
+afterwards is a dictionary lookup plus an array slice.
+
+Windows count rows, not calendar days, to match the
+``rows between n * 7 - 1 preceding and current row`` frame used before.
+"""
+
+import numpy as np
+import polars as pl
+
+from habits.partition import PartitionIndex
+
+# Window sizes offered in the dashboard, in weeks
+WINDOW_WEEKS = (1, 2, 4, 6, 8)
+
+
+def _round(values, decimals=2):
+    # Round half away from zero, like DuckDB's round()
+    scale = 10.0**decimals
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+
+class MovingAverages:
+    """Trailing averages of ``quantity`` per habit for each of ``windows`` weeks."""
+
+    def __init__(self, df_daily, windows=WINDOW_WEEKS):
+        self.windows = {weeks: col for col, weeks in enumerate(windows)}
+        self.index = PartitionIndex(
+            df_daily.select("date", "day", "name", "quantity"), key="name", order="date"
+        )
+        group_start = self.index.group_starts()
+
+        # One cumulative pass over values and non-null counts for all habits
+        values = self.index.df["quantity"].cast(pl.Float64).fill_nan(None).to_numpy()
+        present = ~np.isnan(values)
+        value_sums = np.r_[0.0, np.cumsum(np.where(present, values, 0.0))]
+        counts = np.r_[0, np.cumsum(present)]
+
+        # Column per window, clipped so no window reaches into the previous habit
+        rows = np.arange(len(values))
+        self.matrix = np.empty((len(values), len(self.windows)))
+        for weeks, col in self.windows.items():
+            lower = np.maximum(rows - weeks * 7 + 1, group_start)
+            window_counts = counts[rows + 1] - counts[lower]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self.matrix[:, col] = np.where(
+                    window_counts > 0,
+                    (value_sums[rows + 1] - value_sums[lower]) / window_counts,
+                    np.nan,
+                )
+
+    def get(self, habit, weeks):
+        """Return the habit's rows with its moving average, newest first."""
+        start, end = self.index.offsets.get(habit, (0, 0))
+        return (
+            self.index.df.slice(start, end - start)
+            .with_columns(
+                pl.col("quantity").round(2),
+                pl.Series(
+                    "moving_avg", _round(self.matrix[start:end, self.windows[int(weeks)]])
+                ).fill_nan(None),
+            )
+            .reverse()
+        )
@@ -16,13 +16,28 @@ def __():
     import seaborn as sns
 
     from datetime import timedelta
+    from habits import read_export
+    from habits.export import export_images
     from plotly.subplots import make_subplots
-    return alt, go, make_subplots, mo, pd, pio, pl, plt, sns, timedelta
+    return (
+        alt,
+        export_images,
+        go,
+        make_subplots,
+        mo,
+        pd,
+        pio,
+        pl,
+        plt,
+        read_export,
+        sns,
+        timedelta,
+    )
 
 
 @app.cell
-def __(pd):
-    df = pd.read_csv('AwesomeHabits.csv')
+def __(read_export):
+    df = read_export('AwesomeHabits.csv')
     df
     return (df,)
 
@@ -36,7 +51,7 @@ def __(df, mo):
         with
         prep as (
             select
-                strptime(Date, '%d %b %Y')::date AS day,
+                Date AS day,
                 Name as name,
                 case 
                     when Name in ('Sleep time', 'Screen time') 
@@ -276,10 +291,10 @@ def __(
 
 @app.cell
 def __(
+    export_images,
     fixed_zero_to_one_metrics,
     go,
     make_subplots,
-    pio,
     pl,
     sql,
     timedelta,
@@ -402,7 +417,7 @@ def __(
     #pio.write_image(_fig, "plot.png")
 
     # Export to JPEG
-    pio.write_image(_fig, "plot.jpeg", format="jpeg")
+    export_images([_fig], ["plot.jpeg"], format="jpeg", strict=True)
 
     # Save the figure as an HTML file
     # pio.write_html(_fig, file="plot.html", auto_open=False)
@@ -572,7 +587,7 @@ def __(email, password):
 
 
 @app.cell
-def __(go, make_subplots):
+def __(export_images, go, make_subplots):
     ### Tiles
 
     # Example data
@@ -639,12 +654,12 @@ def __(go, make_subplots):
     )
 
     fig.show()
-    fig.write_image("fig.png")
+    export_images([fig], ["fig.png"], strict=True)
     return current_value, fig, previous_value, time, trend
 
 
 @app.cell
-def __(go):
+def __(export_images, go):
     ### Tiles to HTML
 
     # Create individual figures
@@ -653,11 +668,10 @@ def __(go):
     fig3 = go.Figure(data=go.Pie(values=[10, 20, 30]))
     fig4 = go.Figure(data=go.Indicator(mode="number", value=1234))
 
-    # Save each figure as a PNG image
-    fig1.write_image("fig1.png")
-    fig2.write_image("fig2.png")
-    fig3.write_image("fig3.png")
-    fig4.write_image("fig4.png")
+    # Save each figure as a PNG image, all through one Kaleido session
+    export_images(
+        [fig1, fig2, fig3, fig4], ["fig1.png", "fig2.png", "fig3.png", "fig4.png"], strict=True
+    )
 
     html_content = """
     <!DOCTYPE html>
@@ -0,0 +1,27 @@
+"""Fixtures shared by the tests that load a synthetic export."""
+
+import csv
+from datetime import date
+
+import pytest
+
+from benchmarks.synthetic import write_export
+
+
+@pytest.fixture
+def export(tmp_path):
+    """A small synthetic Awesome Habits export ending on 31 January 2024."""
+    path = tmp_path / "AwesomeHabits.csv"
+    write_export(path, years=0.1, habits=6, end=date(2024, 1, 31))
+    return path
+
+
+@pytest.fixture
+def append():
+    """Appends CSV rows to an export, as the app does when it syncs new days."""
+
+    def append(path, rows):
+        with open(path, "a", newline="") as f:
+            csv.writer(f).writerows(rows)
+
+    return append
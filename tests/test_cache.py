@@ -0,0 +1,48 @@
+"""Processes loading the same export at once must all get it, cold cache or not."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from habits.cache import load_clean, replacing
+from habits.data import clean_export, read_export
+
+
+def _load(path, cache_dir):
+    return load_clean(path, enabled=True, cache_dir=cache_dir)
+
+
+def test_concurrent_cold_loads(export, tmp_path):
+    path = str(export)
+    expected = clean_export(read_export(path))
+    for trial in range(3):
+        cache_dir = str(tmp_path / f"cache-{trial}")
+        with ProcessPoolExecutor(4) as pool:
+            results = list(pool.map(_load, [path] * 8, [cache_dir] * 8))
+        for df_clean in results:
+            pd.testing.assert_frame_equal(df_clean, expected)
+        # Nothing half-written is left behind
+        assert not [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
+
+
+def test_replacing_leaves_other_writers_alone(tmp_path):
+    target = tmp_path / "index.json"
+    with replacing(str(target)) as first, replacing(str(target)) as second:
+        assert first != second
+        with open(first, "w") as f:
+            f.write("first")
+        with open(second, "w") as f:
+            f.write("second")
+    assert target.read_text() == "first"
+    assert os.listdir(tmp_path) == ["index.json"]
+
+
+def test_shared_keeps_the_first_copy(tmp_path):
+    target = tmp_path / "entry.parquet"
+    target.write_text("first")
+    with replacing(str(target), shared=True) as tmp_path_:
+        with open(tmp_path_, "w") as f:
+            f.write("first, again")
+    assert target.read_text() == "first"
+    assert os.listdir(tmp_path) == ["entry.parquet"]
@@ -0,0 +1,37 @@
+"""habits-report's exit code must say whether the report went out whole."""
+
+from datetime import datetime
+
+import pytest
+
+from habits import cli, pipeline
+from habits.stages import Stage
+
+
+@pytest.fixture
+def report(tmp_path, monkeypatch):
+    monkeypatch.setenv("HABITS_CACHE_DIR", str(tmp_path / "cache"))
+    errors, sent = {}, []
+    monkeypatch.setattr(
+        pipeline,
+        "REPORT_STAGES",
+        [
+            Stage("tiles", lambda: ({"Run": b"png"}, errors), (), ("tile_images", "tile_errors")),
+            Stage("send", lambda tile_images: sent.append(tile_images), ("tile_images",)),
+        ],
+    )
+    return str(tmp_path / "export.csv"), errors, sent
+
+
+def test_sent(report):
+    path, _, sent = report
+    assert cli.run(path, datetime(2024, 3, 4, 3)) == cli.EXIT_OK
+    assert sent == [{"Run": b"png"}]
+
+
+def test_tiles_failed(report, capsys):
+    path, errors, sent = report
+    errors["Read"] = "RuntimeError: no Chrome"
+    assert cli.run(path, datetime(2024, 3, 4, 3)) == cli.EXIT_TILES
+    assert sent == [{"Run": b"png"}]
+    assert "Failed to render 1 of the tiles" in capsys.readouterr().err
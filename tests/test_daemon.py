@@ -0,0 +1,80 @@
+"""The watch mode must send each week's report once, when it's due."""
+
+from datetime import date, datetime
+
+import pytest
+
+from habits import daemon, pipeline
+from habits.stages import Stage
+
+SUNDAY = datetime(2024, 3, 3, 12)
+DUE = datetime(2024, 3, 4, 3)  # Monday, once the grace period is over
+NEXT_DUE = datetime(2024, 3, 11, 3)
+
+
+class Sender:
+    """Stands in for the report's stages, failing to send ``failures`` times."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent, self.rendered = [], []
+
+    def send(self, figures):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("SMTP server unavailable")
+        self.sent.append(figures)
+
+
+@pytest.fixture
+def sender(tmp_path, monkeypatch):
+    monkeypatch.setenv("HABITS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(pipeline, "check_fresh", lambda path, now: (tmp_path / "export.csv").stat())
+    sender = Sender()
+    monkeypatch.setattr(
+        pipeline, "DATA_STAGES", [Stage("load", lambda now: now, ("now",), ("data",))]
+    )
+    monkeypatch.setattr(
+        pipeline,
+        "FIGURE_STAGES",
+        [Stage("figures", lambda data: sender.rendered.append(data) or data, ("data",), ("figures",))],
+    )
+    monkeypatch.setattr(pipeline, "DELIVERY_STAGES", [Stage("send", sender.send, ("figures",))])
+    return sender
+
+
+@pytest.fixture
+def watcher(tmp_path, sender):
+    (tmp_path / "export.csv").write_text("Date,Name,Status,Quantity\n")
+    watcher = daemon.ReportDaemon(str(tmp_path / "export.csv"))
+    watcher.reported = date(2024, 2, 26)  # Last week's went out
+    return watcher
+
+
+def test_report_due(sender, watcher):
+    # Rendered ahead, then sent once it's due and not again that week
+    assert watcher.step(SUNDAY) == DUE
+    assert sender.rendered == [DUE] and sender.sent == []
+    assert watcher.step(DUE) == NEXT_DUE
+    assert sender.sent == [DUE]
+    assert watcher.step(datetime(2024, 3, 6, 9)) == NEXT_DUE
+    assert sender.sent == [DUE]
+    assert watcher.reported == date(2024, 3, 4)
+
+
+def test_retry_after_failed_send(sender, watcher):
+    sender.failures = 1
+    retry_at = DUE + daemon.RETRY_SEND
+    assert watcher.step(DUE) == retry_at
+    assert watcher.step(retry_at - daemon.RETRY_SEND / 3) == retry_at
+    assert sender.sent == []
+    assert watcher.step(retry_at) == NEXT_DUE
+    assert sender.sent == [DUE]
+
+
+def test_restart_doesnt_send_again(sender, watcher, tmp_path):
+    watcher.step(DUE)
+    restarted = daemon.ReportDaemon(str(tmp_path / "export.csv"))
+    assert restarted.reported == date(2024, 3, 4)
+    assert restarted.step(DUE + daemon.RETRY_SEND) == NEXT_DUE
+    assert sender.sent == [DUE]
@@ -0,0 +1,43 @@
+"""Import timing must hold up with stages importing side by side."""
+
+import sys
+import threading
+import types
+
+from habits import imports
+
+
+def test_concurrent_import_timers(monkeypatch):
+    monkeypatch.setattr(imports, "IMPORT_TIMES", {})
+    stop = threading.Event()
+    errors = []
+
+    def churn():
+        # Stands in for other stages importing while the timers look
+        while not stop.is_set():
+            for i in range(200):
+                sys.modules[f"_habits_fake_{i}"] = types.ModuleType(f"_habits_fake_{i}")
+            for i in range(200):
+                sys.modules.pop(f"_habits_fake_{i}", None)
+
+    def time_imports():
+        try:
+            for _ in range(200):
+                with imports.import_timer("stage"):
+                    pass
+        except Exception as e:
+            errors.append(e)
+
+    importer = threading.Thread(target=churn)
+    importer.start()
+    timers = [threading.Thread(target=time_imports) for _ in range(4)]
+    try:
+        for thread in timers:
+            thread.start()
+        for thread in timers:
+            thread.join()
+    finally:
+        stop.set()
+        importer.join()
+    assert errors == []
+    assert list(imports.IMPORT_TIMES) == ["stage"]
@@ -0,0 +1,79 @@
+"""Incremental ingestion must always give what a full reload of the export gives."""
+
+import os
+from datetime import date
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_rows
+from habits import ingest
+from habits.data import clean_export, read_export
+
+
+def _full(path):
+    return clean_export(read_export(str(path)))
+
+
+def _check(path, cache_dir):
+    pd.testing.assert_frame_equal(ingest.load_incremental(str(path), str(cache_dir)), _full(path))
+
+
+def test_first_and_unchanged_loads(export, tmp_path):
+    _check(export, tmp_path / "cache")
+    _check(export, tmp_path / "cache")
+
+
+def test_appended_rows(export, append, tmp_path):
+    _check(export, tmp_path / "cache")
+    append(export, [["2024-02-01", "Read", "Done", "1", "", ""]])
+    _check(export, tmp_path / "cache")
+    # A habit first seen in the tail and a mood to be mapped
+    append(export, [
+        ["2024-02-02", "Brand new habit", "Done", "1", "", ""],
+        ["2024-02-02", "Track mood", "Done", "Pleasant", "Calm", "Work"],
+    ])
+    _check(export, tmp_path / "cache")
+    assert len(ingest._parts(ingest.store_dir_for(str(export), str(tmp_path / "cache")))) == 3
+
+
+def test_edited_prefix(export, tmp_path):
+    _check(export, tmp_path / "cache")
+    text = export.read_text()
+    export.write_text(text.replace(",Done,", ",Not done,", 1))
+    _check(export, tmp_path / "cache")
+
+
+def test_tail_before_watermark(export, append, tmp_path):
+    _check(export, tmp_path / "cache")
+    append(export, [["2023-01-01", "Read", "Done", "1", "", ""]])
+    _check(export, tmp_path / "cache")
+
+
+def test_shrunk_export(export, tmp_path):
+    _check(export, tmp_path / "cache")
+    lines = export.read_text().splitlines(keepends=True)
+    export.write_text("".join(lines[:-10]))
+    _check(export, tmp_path / "cache")
+
+
+def test_compaction(export, append, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_PARTS", 2)
+    _check(export, tmp_path / "cache")
+    for day in range(1, 5):
+        append(export, list(generate_rows(years=0, habits=6, seed=day, end=date(2024, 2, day))))
+        _check(export, tmp_path / "cache")
+    assert len(ingest._parts(ingest.store_dir_for(str(export), str(tmp_path / "cache")))) <= 2
+
+
+def test_stores_count_towards_cache_cap(export, tmp_path, monkeypatch):
+    from habits.cache import load_clean
+
+    monkeypatch.setenv("HABITS_INGEST", "incremental")
+    other = tmp_path / "Other.csv"
+    other.write_bytes(export.read_bytes())
+    cache_dir = tmp_path / "cache"
+    load_clean(str(other), cache_dir=str(cache_dir), max_mb=1)
+    load_clean(str(export), cache_dir=str(cache_dir), max_mb=0)
+    assert [p.name for p in cache_dir.iterdir()] == [
+        os.path.basename(ingest.store_dir_for(str(export), str(cache_dir)))
+    ]
@@ -0,0 +1,42 @@
+"""Metrics and profiles kept between runs must stay within their caps."""
+
+import os
+from collections import Counter
+from datetime import datetime
+
+from habits.metrics import JSONL_FILE, write_metrics
+from habits.profiling import write_profiles
+
+RECORD = {
+    "stage": "load",
+    "start": 1_700_000_000.0,
+    "rows_in": 0,
+    "profiler": None,
+    "ok": True,
+    "wall_seconds": 0.1,
+    "cpu_seconds": 0.1,
+    "max_rss_bytes": 2**26,
+    "traced_peak_bytes": None,
+    "rows_out": 10,
+}
+
+
+def test_metrics_log_rotates(tmp_path, monkeypatch):
+    monkeypatch.setenv("HABITS_METRICS_MAX_MB", str(1 / 1024))  # 1 KB
+    for run in range(50):
+        write_metrics([RECORD], str(tmp_path), 1_700_000_000 + run)
+    assert os.path.getsize(tmp_path / JSONL_FILE) < 2048
+    assert os.path.getsize(tmp_path / f"{JSONL_FILE}.1") < 2048
+    assert sorted(os.listdir(tmp_path)) == ["habits_report.prom", JSONL_FILE, f"{JSONL_FILE}.1"]
+
+
+def test_oldest_profiles_dropped(tmp_path, monkeypatch):
+    monkeypatch.setenv("HABITS_PROFILE_MAX_MB", str(1 / 1024))  # 1 KB
+    (tmp_path / "notes").mkdir()  # Not a run, so never evicted
+    stacks = Counter({("main", f"func_{i}"): i + 1 for i in range(20)})
+    for run in range(5):
+        write_profiles([("load", "sampling", stacks)], str(tmp_path), 1_700_000_000 + run * 60)
+    runs = sorted(name for name in os.listdir(tmp_path) if name.startswith("run-"))
+    last = datetime.fromtimestamp(1_700_000_000 + 4 * 60).strftime("run-%Y%m%d-%H%M%S")
+    assert 0 < len(runs) < 5 and runs[-1] == last
+    assert (tmp_path / "notes").is_dir()
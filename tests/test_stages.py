@@ -0,0 +1,80 @@
+"""run_stages must run independent stages side by side and stop cleanly on failure."""
+
+import threading
+
+import pytest
+
+from habits.stages import Stage, StageFailed, run_stages
+
+
+def test_concurrent_branches():
+    # Both branches have to be running at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(x):
+        barrier.wait()
+        return x + 1
+
+    finished = []
+    values = run_stages(
+        [
+            Stage("left", branch, ("x",), ("left",)),
+            Stage("right", branch, ("x",), ("right",)),
+            Stage("join", lambda a, b: a + b, ("left", "right"), ("total",)),
+        ],
+        {"x": 1},
+        workers=2,
+        on_done=lambda stage, seconds: finished.append(stage.name),
+    )
+    assert values == {"x": 1, "left": 2, "right": 2, "total": 4}
+    assert sorted(finished[:2]) == ["left", "right"] and finished[2] == "join"
+
+
+def test_outputs_and_after():
+    order = []
+    values = run_stages(
+        [
+            Stage("pair", lambda: (1, 2), (), ("a", "b")),
+            Stage("side", lambda: order.append("side")),
+            Stage("last", lambda a: order.append("last") or a, ("a",), ("c",), after=("side",)),
+        ]
+    )
+    assert values == {"a": 1, "b": 2, "c": 1}
+    assert order == ["side", "last"]
+
+
+def test_failure_propagates():
+    started = threading.Event()
+    release = threading.Event()
+    ran = []
+
+    def slow():
+        started.set()
+        release.wait(5)
+        ran.append("slow")
+
+    def broken():
+        started.wait(5)
+        release.set()
+        raise KeyError("boom")
+
+    with pytest.raises(StageFailed) as info:
+        run_stages(
+            [
+                Stage("slow", slow),
+                Stage("broken", broken, (), ("x",)),
+                Stage("after", lambda x: ran.append("after"), ("x",)),
+            ],
+            workers=2,
+        )
+    assert info.value.stage == "broken"
+    assert isinstance(info.value.__cause__, KeyError)
+    # What was already running finished, what depended on the failure never started
+    assert ran == ["slow"]
+
+
+def test_bad_graphs():
+    with pytest.raises(ValueError, match="Nothing provides"):
+        run_stages([Stage("a", lambda x: x, ("x",), ("y",))])
+    with pytest.raises(ValueError, match="depend on each other"):
+        run_stages([Stage("a", lambda y: y, ("y",), ("x",)), Stage("b", lambda x: x, ("x",), ("y",))])
@@ -0,0 +1,27 @@
+"""A report whose tiles are all cached must not start a browser."""
+
+import pytest
+
+from habits import export
+from habits.artifacts import ArtifactCache, artifact_key
+from habits.tiles import TILE_VERSION, render_tiles
+
+
+@pytest.fixture
+def no_browser(monkeypatch):
+    def kaleido_session():
+        raise AssertionError("Started a Kaleido session")
+
+    monkeypatch.setattr(export, "kaleido_session", kaleido_session)
+
+
+def test_export_nothing(no_browser):
+    assert export.export_images([], []) == []
+
+
+def test_all_cached(tmp_path, no_browser):
+    cache = ArtifactCache(str(tmp_path), max_mb=1, enabled=True)
+    tiles = [("Run", [0.5, 0.75], "2024-03-04"), ("Read", [1.0, 0.25], "2024-03-04")]
+    for i, (habit, trend, time) in enumerate(tiles):
+        cache.put(artifact_key("tile", TILE_VERSION, 1, habit, trend, time), b"png %d" % i)
+    assert render_tiles(tiles, workers=4, cache=cache) == ({"Run": b"png 0", "Read": b"png 1"}, {})
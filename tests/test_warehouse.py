@@ -0,0 +1,64 @@
+"""Refreshing the DuckDB tables must always give what rebuilding them gives."""
+
+from datetime import date, datetime
+
+import duckdb
+from polars.testing import assert_frame_equal
+
+from benchmarks.synthetic import generate_rows
+from habits.data import clean_export, read_export
+from habits.warehouse import CHECKSUM_SQL, materialize
+
+NOW = datetime(2024, 3, 1)
+
+
+def _check(path, db_path):
+    df_clean = clean_export(read_export(str(path)))
+    daily, weekly = materialize(df_clean, str(db_path), NOW)
+    full_daily, full_weekly = materialize(df_clean, ":memory:", NOW)
+    assert_frame_equal(daily, full_daily)
+    assert_frame_equal(weekly, full_weekly)
+
+
+def test_first_and_unchanged_refreshes(export, tmp_path):
+    _check(export, tmp_path / "habits.duckdb")
+    _check(export, tmp_path / "habits.duckdb")
+
+
+def test_appended_rows(export, append, tmp_path):
+    _check(export, tmp_path / "habits.duckdb")
+    # More of the last refreshed day, then the following days
+    append(export, [["2024-01-31", "Brand new habit", "Done", "1", "", ""]])
+    _check(export, tmp_path / "habits.duckdb")
+    for day in range(1, 4):
+        append(export, list(generate_rows(years=0, habits=6, seed=day, end=date(2024, 2, day))))
+        _check(export, tmp_path / "habits.duckdb")
+
+
+def test_edited_rows(export, append, tmp_path):
+    _check(export, tmp_path / "habits.duckdb")
+    text = export.read_text()
+    export.write_text(text.replace(",Done,", ",Skipped,", 1))
+    _check(export, tmp_path / "habits.duckdb")
+    # An older row added out of order counts as an edit too
+    append(export, [["2023-12-27", "Track steps", "Done", "12345", "", ""]])
+    _check(export, tmp_path / "habits.duckdb")
+
+
+def test_removed_rows(export, tmp_path):
+    _check(export, tmp_path / "habits.duckdb")
+    lines = export.read_text().splitlines(keepends=True)
+    export.write_text("".join(lines[:-10]))
+    _check(export, tmp_path / "habits.duckdb")
+
+
+def test_unchanged_history_is_trusted(export, tmp_path):
+    # Otherwise every refresh silently rebuilds both tables
+    df_clean = clean_export(read_export(str(export)))
+    materialize(df_clean, str(tmp_path / "habits.duckdb"), NOW)
+    with duckdb.connect(str(tmp_path / "habits.duckdb")) as con:
+        last_date, rows, checksum = con.execute(
+            "select last_date, rows, checksum from refresh_state"
+        ).fetchone()
+        con.register("df_clean", df_clean)
+        assert con.execute(CHECKSUM_SQL, [last_date]).fetchone() == (rows, checksum)
@@ -0,0 +1,45 @@
+"""Moving averages must match the window query the dashboard used to run."""
+
+from datetime import date, datetime
+
+import duckdb
+import pytest
+from polars.testing import assert_frame_equal
+
+from benchmarks.synthetic import write_export
+from habits.data import clean_export, read_export
+from habits.warehouse import materialize
+from habits.windows import WINDOW_WEEKS, MovingAverages
+
+# The dashboard's query before the moving averages were precomputed
+WINDOW_SQL = """
+select
+    date,
+    day,
+    name,
+    round(quantity, 2) as quantity,
+    round(avg(quantity) over (
+        partition by name
+        order by date
+        rows between {weeks} * 7 - 1 preceding and current row
+    ), 2) as moving_avg
+from df_daily
+where name = ?
+order by date desc
+"""
+
+
+@pytest.fixture(scope="module")
+def df_daily(tmp_path_factory):
+    path = tmp_path_factory.mktemp("export") / "AwesomeHabits.csv"
+    write_export(path, years=0.5, habits=8, end=date(2024, 1, 31))
+    return materialize(clean_export(read_export(str(path))), ":memory:", datetime(2024, 3, 1))[0]
+
+
+@pytest.mark.parametrize("weeks", WINDOW_WEEKS)
+def test_matches_window_query(df_daily, weeks):
+    averages = MovingAverages(df_daily)
+    assert averages.index.offsets
+    for habit in averages.index.offsets:
+        expected = duckdb.execute(WINDOW_SQL.format(weeks=weeks), [habit]).pl()
+        assert_frame_equal(averages.get(habit, weeks), expected)